@@ -107,10 +107,15 @@ def create_app():
 
         data_status = f"Data loaded: {len(df)} rows"
         app.df = df
+        # 刻字索引：「文字」欄位只解析一次，比對時直接用
+        from app.utils.matcher import build_imprint_index
+        app.imprint_index = build_imprint_index(df)
         # 動態生成分類字典
-        color_dict, shape_dict, invalid_colors = generate_color_shape_dicts(df)
+        color_dict, shape_dict, invalid_colors, color_shape_masks = generate_color_shape_dicts(df, with_masks=True)
         app.color_dict = color_dict
         app.shape_dict = shape_dict
+        # 顏色 / 外型遮罩（與 df 列位置對齊），/match 篩選用
+        app.color_shape_masks = color_shape_masks
         ###以下可刪
         # === Color statistics (per designed buckets) ===
         COLOR_BUCKETS = ["白色","黃色","黑色","棕色","紅色","透明","皮膚色","橘色","綠色","藍色","紫色","粉紅色","灰色"]
@@ -1,26 +1,153 @@
 import imghdr
 import io
+import json
 import os
 from io import BytesIO
 
 import cv2
 import numpy as np
 import pandas as pd
-from flask import request, jsonify, render_template
+from flask import request, jsonify, render_template, Request, Response, send_file, abort
 import base64
 import time
 import shutil
-from app.utils.matcher import match_top_n_ocr_to_front_back
+from app.utils.matcher import match_top_n_ocr_to_front_back, match_ocr
 import tempfile
 from PIL import Image
 from pillow_heif import register_heif_opener
-from app.utils.matcher import match_ocr_to_front_back_by_permuted_ocr, lcs_score
+from app.utils.matcher import match_ocr_to_front_back_by_permuted_ocr, lcs_score, CANDIDATE_FLOOR
+from app.utils.data_loader import build_color_shape_masks
+from app.utils.multimodal import fused_top_n, row_colors
 
 register_heif_opener()  # register HEIC
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
-from app.utils.pill_detection import process_image
+# 前端上傳前先在 canvas 縮圖並重新編碼（由 /api/status 告知前端）；0 = 不縮圖（預設，原檔上傳）
+# 縮圖會改變偵測 / OCR 的輸入，開啟前先用 main_batch_test.py 比較辨識結果
+UPLOAD_MAX_LONG_EDGE = int(os.getenv("UPLOAD_MAX_LONG_EDGE", "0"))
+UPLOAD_JPEG_QUALITY = float(os.getenv("UPLOAD_JPEG_QUALITY", "0.9"))
+
+# /match 排序方式：filter = 顏色 / 外型硬篩選後依文字分數排序（預設）；
+# fused = 文字、顏色、外型融合成一個分數排序（app/utils/multimodal.py，權重見 MATCH_WEIGHT_*）；
+#         回應格式與 filter 相同：Top-1 文字分數 < MIN_TOP1_ACCEPT 請重拍，< CANDIDATE_FLOOR 回傳單筆 low_confidence，
+#         否則回傳融合排序的 candidates（score 為融合分數，另附 text_score / color_score / shape_score）
+MATCH_RANKING = os.getenv("MATCH_RANKING", "filter")
+
+# 無文字比對結果分頁（依用量排序，由常用到少用）
+NO_TEXT_VALUES = ["F:NONE|B:NONE", "F:None|B:None"]
+NO_TEXT_PAGE_SIZE = 20
+NO_TEXT_MAX_PAGE_SIZE = 50
+
+# /drug-image 的快取時間（網址帶版本參數，換圖網址就會變）
+DRUG_IMAGE_MAX_AGE = int(os.getenv("DRUG_IMAGE_MAX_AGE", str(365 * 24 * 3600)))
+
+from app.utils.pill_detection import process_image, CROP_MAX_SIDE
+from app.utils.image_io import open_image_scaled, pil_to_bgr
+from app.utils.drug_images import DEFAULT_VARIANT, build_thumbnail, drug_image_url, get_pack
+
+
+class InMemoryUploadRequest(Request):
+    """multipart 上傳的檔案一律放記憶體（Werkzeug 預設超過 500KB 會寫暫存檔）"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return BytesIO()
+
+
+def read_upload_stream():
+    """
+    依 Content-Type 取得上傳圖片的 file-like（給 Pillow 直接解碼）：
+    - multipart/form-data：欄位 image（前端預設）
+    - image/* 或 application/octet-stream：整個 body 就是圖片
+    - application/json：舊版 {"image": "data:image/...;base64,..."}
+    缺少圖片時丟 ValueError
+    """
+    mimetype = request.mimetype or ""
+    if mimetype == "multipart/form-data":
+        f = request.files.get("image")
+        if f is None:
+            raise ValueError("缺少 image 欄位")
+        return f.stream
+    if mimetype.startswith("image/") or mimetype == "application/octet-stream":
+        body = request.get_data(cache=False)
+        if not body:
+            raise ValueError("缺少圖片內容")
+        return BytesIO(body)
+
+    data = request.get_json(silent=True)
+    if not data or "image" not in data:
+        raise ValueError("缺少 image 欄位")
+    b64_data = data["image"]
+    if b64_data.startswith("data:"):
+        b64_data = b64_data.split(",")[1]
+    return BytesIO(base64.b64decode(b64_data))
+
+
+def encode_cursor(rank, pos):
+    """
+    分頁 cursor：上一頁最後一筆的（排序值, 列 index）（不透明字串，前端原樣送回）
+    排序值相同或為 NaN 的列靠列 index 區分，才不會在換頁時被跳過
+    """
+    rank = None if pd.isna(rank) else float(rank)
+    raw = json.dumps({"rank": rank, "pos": int(pos)}).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """回傳 (排序值或 None（NaN）, 列 index)；沒有 cursor（第一頁）回傳 None，格式錯誤丟 ValueError"""
+    if not cursor:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        rank = None if data["rank"] is None else float(data["rank"])
+        return rank, int(data["pos"])
+    except Exception:
+        raise ValueError("cursor 格式錯誤")
+
+
+def parse_page_limit(limit):
+    """每頁筆數：沒給時用 NO_TEXT_PAGE_SIZE，超出範圍夾在 1 ~ NO_TEXT_MAX_PAGE_SIZE，不是整數丟 ValueError"""
+    if limit is None:
+        return NO_TEXT_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit 必須是整數")
+    return max(1, min(limit, NO_TEXT_MAX_PAGE_SIZE))
+
+
+def paginate_no_text_candidates(df_sub, cursor=None, limit=NO_TEXT_PAGE_SIZE):
+    """
+    無文字情境：篩出「F:NONE|B:NONE」的候選，依（用量排序, 列 index）排序後以 cursor 分頁
+    用量排序為 NaN 的列排在最後；只有這一頁的列才會組成回傳資料（含圖片網址）
+    - return: (這一頁的 rows, next_cursor 或 None, 總筆數)
+    """
+    limit = parse_page_limit(limit)
+    after = decode_cursor(cursor)
+
+    no_text = df_sub[df_sub["文字"].astype(str).str.strip().isin(NO_TEXT_VALUES)]
+    if "用量排序" in no_text.columns:
+        rank = pd.to_numeric(no_text["用量排序"], errors="coerce").to_numpy(dtype=float)
+    else:
+        rank = no_text.index.to_numpy(dtype=float)
+    pos = no_text.index.to_numpy(dtype=np.int64)
+    missing = np.isnan(rank)
+    filled = np.where(missing, 0.0, rank)
+    order = np.lexsort((pos, filled, missing))
+    total = len(order)
+    if after is not None:
+        after_rank, after_pos = after
+        after_missing = after_rank is None
+        after_rank = 0.0 if after_missing else after_rank
+        m, r, p = missing[order], filled[order], pos[order]
+        # （NaN 與否, 排序值, 列 index）嚴格大於 cursor 的列
+        later = (m > after_missing) | ((m == after_missing)
+                                       & ((r > after_rank) | ((r == after_rank) & (p > after_pos))))
+        order = order[later]
+
+    page = order[:limit]
+    next_cursor = encode_cursor(rank[page[-1]], pos[page[-1]]) if len(order) > limit else None
+    return no_text.iloc[page].to_dict("records"), next_cursor, total
 
 
 def safe_get(row, key):
@@ -85,12 +212,18 @@ def get_fallback_html():
 
 def register_routes(app, data_status):
     """註冊所有路由到 Flask app"""
+    app.request_class = InMemoryUploadRequest
 
     # 從 app 取得數據，如果沒有則創建空的 DataFrame
     df = getattr(app, 'df', pd.DataFrame())
 
     color_dict = getattr(app, 'color_dict', {})
     shape_dict = getattr(app, 'shape_dict', {})
+    imprint_index = getattr(app, 'imprint_index', None)
+    # 顏色 / 外型遮罩（與 df 列位置對齊）；create_app 沒建時在這裡補建
+    color_shape_masks = getattr(app, 'color_shape_masks', None)
+    if color_shape_masks is None and isinstance(df, pd.DataFrame) and not df.empty:
+        color_shape_masks = build_color_shape_masks(df, color_dict, shape_dict)
 
     @app.route("/")
     def index():
@@ -154,6 +287,11 @@ def register_routes(app, data_status):
         info["file_exists"] = {
             path_name: os.path.exists(path) for path_name, path in info["file_paths"].items()
         }
+        try:
+            from app.utils.ocr_engine import ocr_session_config
+            info["ocr_session"] = ocr_session_config()
+        except Exception as e:
+            info["ocr_session"] = f"Error: {str(e)}"
         info["color_dict_keys"] = list(color_dict.keys())
         info["shape_dict_keys"] = list(shape_dict.keys())
         return f"""
@@ -195,52 +333,46 @@ def register_routes(app, data_status):
 
     @app.route("/upload", methods=["POST"])
     def upload_image():
-        temp_path = None
+        """
+        上傳藥品照片辨識；接受 multipart/form-data（欄位 image）、
+        raw body（Content-Type: image/*）或舊版 JSON {"image": base64}
+        """
         try:
             t0 = time.perf_counter()
-            # === 1. 解析 JSON 並確認欄位 ===
-            data = request.get_json()
-            if not data or "image" not in data:
-                return jsonify({"ok": False, "error": "缺少 image 欄位"}), 400
-            b64_data = data["image"]
+            # === 1. 取得圖片資料（multipart / raw body / 舊版 base64 JSON）===
+            try:
+                stream = read_upload_stream()
+            except ValueError as e:
+                return jsonify({"ok": False, "error": str(e)}), 400
             # t1 = time.perf_counter()
-            # print(f"📥 base64 JSON 接收：{(t1 - t0) * 1000:.1f} ms")
+            # print(f"📥 請求解析：{(t1 - t0) * 1000:.1f} ms")
 
-            # === 2. 嘗試剝除 base64 header 並解碼 ===
-            if b64_data.startswith("data:"):
-                b64_data = b64_data.split(",")[1]
-            image_bytes = base64.b64decode(b64_data)
-            # t2 = time.perf_counter()
-            # print(f"🧪 base64 解碼成功：{(t2 - t1) * 1000:.1f} ms")
-
-            # === 3. 嘗試用 Pillow 解析圖片格式 ===
-            # === 3. 嘗試用 Pillow 解析圖片格式 ===
+            # === 2. 用 Pillow 直接從 stream 解碼 ===
             image = None
             try:
-                image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+                # 大圖在解碼時就縮到裁切需要的解析度（CROP_MAX_SIDE=0 時解原圖）
+                image = open_image_scaled(stream, max_side=CROP_MAX_SIDE)
                 # （已移除 image.verify() 以避免重複解碼/重開）
             except Exception as e:
 
                 print(f"❌ [UPLOAD] Pillow 無法辨識圖片格式: {e}")
-                fmt = imghdr.what(None, image_bytes)
+                stream.seek(0)
+                fmt = imghdr.what(None, stream.read(32))
                 print(f"❌ [UPLOAD] imghdr 檢測結果: {fmt}")
                 return jsonify({"ok": False, "error": "不支援的圖片格式"}), 400
 
             # t3 = time.perf_counter()
-            # print(f"🖼️ Pillow 解碼驗證：{(t3 - t2) * 1000:.1f} ms")
-
-            # === 4. 暫存為圖片檔案（JPEG）===
-            import tempfile
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-            temp_path = temp_file.name
-            image.save(temp_path, format="JPEG")
-            temp_file.close()
+            # print(f"🖼️ Pillow 解碼驗證：{(t3 - t1) * 1000:.1f} ms")
+
+            # === 3. 轉成 BGR ndarray（不再存暫存 JPEG：少一次解碼與有損重新編碼）===
+            image_bgr = pil_to_bgr(image)
+            image = None  # 釋放 PIL 影像，只留一份解碼結果
             # t4 = time.perf_counter()
-            # print(f"🧠 圖片儲存至暫存檔：{(t4 - t3) * 1000:.1f} ms")
+            # print(f"🧠 轉 BGR ndarray：{(t4 - t3) * 1000:.1f} ms")
 
-            # === 5. 呼叫核心辨識邏輯（傳圖片路徑）===
+            # === 4. 呼叫核心辨識邏輯（直接傳已解碼影像）===
 
-            result = process_image(temp_path) or {}
+            result = process_image(image_bgr) or {}
             t5 = time.perf_counter()
             # 如果 process_image 回傳錯誤 → 不要丟 500，直接回應 JSON
             if isinstance(result, dict) and "error" in result:
@@ -251,7 +383,7 @@ def register_routes(app, data_status):
                     "result": {"文字辨識": [], "顏色": [], "外型": "", "cropped_image": ""}
                 }), 200  # ✅ 回傳 200，表示 API 正常運作，只是無結果
 
-            # === 6. 回傳 + 結束 ===
+            # === 5. 回傳 + 結束 ===
             print(
                 f"🟢 [UPLOAD] 推論成功：文字={result['文字辨識']}最佳版本={result['最佳版本']}信心分數={result['信心分數']} 顏色={result['顏色']} 外型={result['外型']}")
             print(f"⏱️ [UPLOAD] 完成，總耗時 {(t5 - t0):.2f} s")
@@ -268,12 +400,6 @@ def register_routes(app, data_status):
                 "error": f"{e}",
                 "result": {"文字辨識": [], "顏色": [], "外型": "", "cropped_image": ""}
             }), 200
-        finally:
-            try:
-                if temp_path and os.path.exists(temp_path):
-                    os.remove(temp_path)
-            except Exception as e:
-                print(f"⚠️ [UPLOAD] 臨時檔清理失敗：{e}")
 
     @app.route("/api/status")
     def api_status():
@@ -282,9 +408,41 @@ def register_routes(app, data_status):
             "version": "1.0.0",
             "data_loaded": hasattr(app, 'df') and app.df is not None,
             "data_rows": len(app.df) if hasattr(app, 'df') and app.df is not None else 0,
-            "endpoints": ["/", "/healthz", "/debug", "/api/status"]
+            "endpoints": ["/", "/healthz", "/debug", "/api/status"],
+            "upload": {
+                "max_long_edge": UPLOAD_MAX_LONG_EDGE,
+                "jpeg_quality": UPLOAD_JPEG_QUALITY,
+            },
         })
 
+    @app.route("/drug-image/<code>")
+    def drug_image(code):
+        """
+        參考藥品縮圖（ETag / Last-Modified 條件式請求 + 長時間快取）
+        - ?size=sm|md|lg：打包檔的解析度（預設 md）；沒有打包檔時只有單一尺寸
+        """
+        pack = get_pack()
+        entry = pack.get(code, request.args.get("size", DEFAULT_VARIANT)) if pack is not None else None
+        if entry is not None:
+            # WSGI 回應內容必須是 bytes（memoryview 會被 Werkzeug / gunicorn 拒絕），從 mmap 切片複製一份
+            data, etag, mtime = entry
+            resp = Response(bytes(data), mimetype=pack.mimetype)
+            resp.set_etag(etag)
+            resp.last_modified = mtime
+            resp.cache_control.max_age = DRUG_IMAGE_MAX_AGE
+            resp = resp.make_conditional(request)
+        else:
+            thumb = build_thumbnail(code)
+            if thumb is None:
+                abort(404)
+            # 絕對路徑：send_file 會把相對路徑接在 app.root_path（app/）後面
+            resp = send_file(thumb.resolve(), mimetype="image/jpeg", conditional=True, etag=True,
+                             max_age=DRUG_IMAGE_MAX_AGE)
+        resp.cache_control.public = True
+        if request.args.get("v"):
+            resp.cache_control.immutable = True
+        return resp
+
     # print("✓ Routes registered successfully")
     MIN_TOP1_ACCEPT = 0.30  # Top-1 分數低於此值 → 請重拍
     HARD_THRESHOLD = 0.80  # 正常門檻
@@ -307,76 +465,113 @@ def register_routes(app, data_status):
             if df.empty:
                 print("🔴 [MATCH] 錯誤：資料庫未載入")
                 return jsonify({"error": "資料庫未載入"}), 500
+
+            # === 融合排序：顏色 / 外型只影響排名，不剔除候選 ===
+            if MATCH_RANKING == "fused" and texts and texts != ["None"]:
+                ranked = fused_top_n(texts, expanded_colors, shape, df, color_shape_masks,
+                                     index=imprint_index, top_n=4)
+                # 與 filter 路徑相同的判斷，以文字分數為準：
+                # Top-1 文字分數 < MIN_TOP1_ACCEPT → 請重拍；< CANDIDATE_FLOOR → 只回傳第一名（low_confidence）
+                best_text = max((r["text_score"] for r in ranked), default=0.0)
+                if best_text < MIN_TOP1_ACCEPT:
+                    return jsonify({
+                        "error": "影像過於模糊或光線不足，建議重拍（請讓藥面填滿畫面、避免反光、對焦清晰）。",
+                        "need_retake": True
+                    }), 422
+                if best_text < CANDIDATE_FLOOR:
+                    print("🟠 [MATCH] 融合排序文字分數未達候選門檻，回傳 Top-1（low_confidence）")
+                    top = ranked[0]
+                    row = top["row"].to_dict()
+                    return jsonify({
+                        "name": safe_get(row, "學名"),
+                        "symptoms": safe_get(row, "適應症"),
+                        "precautions": safe_get(row, "用藥指示與警語"),
+                        "side_effects": safe_get(row, "副作用"),
+                        "drug_image": drug_image_url(row.get("批價碼", "")),
+                        "score": round(top["score"], 3),
+                        "text_score": round(top["text_score"], 3),
+                        "side": top["side"],
+                        "low_confidence": True
+                    }), 200
+                results, seen = [], set()
+                for match in ranked:
+                    row = match["row"].to_dict()
+                    drug_id = row.get("批價碼", "")
+                    if not drug_id or drug_id in seen:
+                        continue
+                    seen.add(drug_id)
+                    results.append({
+                        "name": safe_get(row, "學名"),
+                        "symptoms": safe_get(row, "適應症"),
+                        "precautions": safe_get(row, "用藥指示與警語"),
+                        "side_effects": safe_get(row, "副作用"),
+                        "drug_image": drug_image_url(drug_id),
+                        "score": round(match["score"], 3),
+                        "text_score": round(match["text_score"], 3),
+                        "color_score": round(match["color_score"], 3),
+                        "shape_score": round(match["shape_score"], 3),
+                        "match": match["match"],
+                        "side": match["side"],
+                        "顏色": collapse_colors(match["matched_colors"])
+                    })
+                print(f"🟢 [MATCH] 融合排序 Top-{len(results)} 完成，準備回傳")
+                return jsonify({"candidates": results}), 200
+
             # print("🟡 [MATCH] 開始篩選候選藥物")
-            # 尋找候選藥物
-            candidates = set()
-            # --- 顏色交集 ---
-            color_sets = []
+            # 尋找候選藥物（顏色 OR、外型 AND，直接以預先建好的遮罩運算）
             for color in expanded_colors:
-                ids = set(color_dict.get(color, []))
-                print(f"    - 顏色篩選：{color} ➜ {len(ids)} 筆")
-                color_sets.append(ids)
-
-            if color_sets:
-                candidates = set.union(*color_sets)
-                print(f"    ✅ 顏色交集後 ➜ {len(candidates)} 筆")
-            else:
-                candidates = set()
+                print(f"    - 顏色篩選：{color} ➜ {int(color_shape_masks.color_mask(color).sum())} 筆")
+            positions = color_shape_masks.select(expanded_colors)
+            if expanded_colors:
+                print(f"    ✅ 顏色交集後 ➜ {len(positions)} 筆")
 
             # --- 外型交集 ---
             if shape:
-                before_shape = len(candidates)
-                shape_ids = set(shape_dict.get(shape, []))
-                candidates &= shape_ids
-                print(f"    ✅ 外型交集：{shape} ➜ 從 {before_shape} 筆減為 {len(candidates)} 筆")
+                before_shape = len(positions)
+                positions = color_shape_masks.select(expanded_colors, shape)
+                print(f"    ✅ 外型交集：{shape} ➜ 從 {before_shape} 筆減為 {len(positions)} 筆")
 
             # === 無候選處理 ===
-            if not candidates:
+            if len(positions) == 0:
                 print("🔴 [MATCH] 沒有符合的候選藥物")
                 return jsonify({"error": "找不到符合顏色與外型的藥品"}), 404
 
-            # 篩選數據
-            df_sub = df[df["用量排序"].isin(candidates)] if "用量排序" in df.columns else df
-            print(f"🟡 [MATCH] 經過篩選剩下 {len(df_sub)} 筆藥物")
+            # 篩選數據：列位置直接交給 matcher，不再對 DataFrame 做布林篩選
+            print(f"🟡 [MATCH] 經過篩選剩下 {len(positions)} 筆藥物")
             # 如果沒有文字或文字為空
             if not texts or texts == ["None"]:
                 print("🟡 [MATCH] 無文字情境，搜尋純顏色/外型比對結果")
-                results = []
-                for _, row in df_sub.iterrows():
-                    if str(row.get("文字", "")).strip() not in ["F:NONE|B:NONE", "F:None|B:None"]:
-                        continue
-
-                    # 尋找藥物圖片
-                    picture_path = os.path.join("data/pictures", f"{row.get('批價碼', '')}.jpg")
-                    picture_base64 = ""
-                    if os.path.exists(picture_path):
-                        try:
-                            with open(picture_path, "rb") as f:
-                                picture_base64 = f"data:image/jpeg;base64,{base64.b64encode(f.read()).decode('utf-8')}"
-                        except Exception as e:
-                            print(f"Error reading picture {picture_path}: {e}")
-
-                    results.append({
-                        "name": safe_get(row, "學名"),
-                        "symptoms": safe_get(row, "適應症"),
-                        "precautions": safe_get(row, "用藥指示與警語"),
-                        "side_effects": safe_get(row, "副作用"),
-                        "drug_image": picture_base64
-                    })
+                try:
+                    rows, next_cursor, total = paginate_no_text_candidates(
+                        df.iloc[positions], cursor=data.get("cursor"), limit=data.get("limit")
+                    )
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+
+                results = [{
+                    "name": safe_get(row, "學名"),
+                    "symptoms": safe_get(row, "適應症"),
+                    "precautions": safe_get(row, "用藥指示與警語"),
+                    "side_effects": safe_get(row, "副作用"),
+                    "drug_image": drug_image_url(row.get("批價碼", ""))  # 圖片網址（/drug-image）
+                } for row in rows]
 
-                return jsonify({"candidates": results})
+                return jsonify({"candidates": results, "next_cursor": next_cursor, "total": total})
             # print("[DEBUG] STEP 4 - Shape", shape)
             # 進行 OCR 比對 - 這個函數需要你實作或匯入
             # === 有文字：先用正常門檻比對 ===
             # print(f"🟡 [MATCH] 有文字，要進行比對 ➜ {texts}")
             # match_result = match_ocr_to_front_back_by_permuted_ocr(texts, df_sub, threshold=HARD_THRESHOLD)
 
-            top_matches = match_top_n_ocr_to_front_back(texts, df_sub, threshold=HARD_THRESHOLD, top_n=4)
+            # top-N 與各面最佳結果一次算完（不必再以 threshold=0.0 重掃一次）
+            match_result = match_ocr(texts, df, threshold=HARD_THRESHOLD, top_n=4,
+                                     index=imprint_index, positions=positions)
+            top_matches = match_result["top"]
 
             # === 門檻沒過：降門檻取 Top-1 回傳（low_confidence） ===
             if not top_matches:
                 print("🟠 [MATCH] 門檻未通過，啟用 Top-1 回傳（low_confidence）")
-                fallback = match_ocr_to_front_back_by_permuted_ocr(texts, df_sub, threshold=0.0)
+                fallback = match_result["best"]
 
                 # 從 front/back 取分數最高者
                 best, best_side = None, None
@@ -393,18 +588,12 @@ def register_routes(app, data_status):
                     if isinstance(row, pd.Series):
                         row = row.to_dict()
 
-                    picture_path = os.path.join("data/pictures", f"{row.get('批價碼', '')}.jpg")
-                    picture_base64 = ""
-                    if os.path.exists(picture_path):
-                        with open(picture_path, "rb") as f:
-                            picture_base64 = f"data:image/jpeg;base64,{base64.b64encode(f.read()).decode('utf-8')}"
-
                     return jsonify({
                         "name": safe_get(row, "學名"),
                         "symptoms": safe_get(row, "適應症"),
                         "precautions": safe_get(row, "用藥指示與警語"),
                         "side_effects": safe_get(row, "副作用"),
-                        "drug_image": picture_base64,
+                        "drug_image": drug_image_url(row.get("批價碼", "")),
                         "score": round(best["score"], 3),
                         "side": best_side,
                         "low_confidence": True
@@ -431,17 +620,9 @@ def register_routes(app, data_status):
                     continue
                 seen.add(drug_id)
 
-                picture_path = os.path.join("data/pictures", f"{drug_id}.jpg")
-                picture_base64 = ""
-                if os.path.exists(picture_path):
-                    try:
-                        with open(picture_path, "rb") as f:
-                            picture_base64 = f"data:image/jpeg;base64,{base64.b64encode(f.read()).decode('utf-8')}"
-                    except Exception as e:
-                        print(f"Error reading picture {picture_path}: {e}")
                 # === COLLAPSE COLORS BEFORE RETURN ===
                 
-                matched_colors = match.get("matched_colors", [])  # you need to have this from your matching step
+                matched_colors = [c for c in row_colors(row) if c in expanded_colors]
                 frontend_colors = collapse_colors(matched_colors)
 
                 results.append({
@@ -449,7 +630,7 @@ def register_routes(app, data_status):
                     "symptoms": safe_get(row, "適應症"),
                     "precautions": safe_get(row, "用藥指示與警語"),
                     "side_effects": safe_get(row, "副作用"),
-                    "drug_image": picture_base64,
+                    "drug_image": drug_image_url(drug_id),
                     "score": round(match["score"], 3),
                     "match": match["match"],
                     "side": match["side"],
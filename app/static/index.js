@@ -26,30 +26,64 @@ customFileButton.addEventListener('click', () => {
 fileInput.addEventListener('change', async (event) => {
     const file = event.target.files[0];
     if (file) {
-        const reader = new FileReader();
-        reader.onload = async function (e) {
-            Detection(e.target.result);
-        };
-        reader.readAsDataURL(file);
+        Detection(file);
     }
 });
 
 uploadInput.addEventListener('change', async (event) => {
     const file = event.target.files[0];
     if (file) {
-        const reader = new FileReader();
-        reader.onload = function (e) {
-            Detection(e.target.result);
-        };
-        reader.readAsDataURL(file);
+        Detection(file);
     }
 });
-async function Detection(imageData) {
+// 上傳縮圖設定（由 /api/status 提供，取不到時不縮圖）
+const uploadConfigPromise = fetch('/api/status')
+    .then(res => res.json())
+    .then(data => data.upload || {})
+    .catch(() => ({}));
+
+// 上傳前在 canvas 縮到長邊 ≤ max_long_edge 並重新編碼成 JPEG；
+// 已夠小的 JPEG 或瀏覽器無法解碼（例如部分瀏覽器的 HEIC）時直接傳原檔
+async function resizeForUpload(file) {
+    const cfg = await uploadConfigPromise;
+    const maxEdge = cfg.max_long_edge ?? 0;
+    const quality = cfg.jpeg_quality ?? 0.9;
+    if (!maxEdge) return file;
+
+    let bitmap;
     try {
+        bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+    } catch (err) {
+        console.warn('[UPLOAD] 無法在瀏覽器解碼，改傳原檔：', err);
+        return file;
+    }
+    const scale = Math.min(1, maxEdge / Math.max(bitmap.width, bitmap.height));
+    if (scale === 1 && file.type === 'image/jpeg') {
+        bitmap.close();
+        return file;
+    }
+
+    const canvas = document.createElement('canvas');
+    canvas.width = Math.round(bitmap.width * scale);
+    canvas.height = Math.round(bitmap.height * scale);
+    const ctx = canvas.getContext('2d');
+    ctx.imageSmoothingQuality = 'high';
+    ctx.drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+    bitmap.close();
+
+    const blob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', quality));
+    return blob && blob.size < file.size ? blob : file;
+}
+
+async function Detection(file) {
+    try {
+        // multipart 直接傳檔案本身（不轉 base64 data URL，少 33% 傳輸量）
+        const upload = await resizeForUpload(file);
+        const form = new FormData();
+        form.append('image', upload, upload === file ? (file.name || 'upload.jpg') : 'upload.jpg');
         const res = await fetch('/upload', {
             method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({ image: imageData })
+            body: form
         });
 
         const ctype = res.headers.get('content-type') || '';
@@ -97,6 +131,81 @@ async function Detection(imageData) {
 }
 
 
+// 多候選模式：把一頁候選加到清單；無文字比對有下一頁時顯示「載入更多」
+function appendCandidates(candidateList, candidates) {
+    candidates.forEach((drug) => {
+        const wrapper = document.createElement('div');
+        wrapper.style.display = 'flex';
+        wrapper.style.flexDirection = 'column';
+        wrapper.style.alignItems = 'center';
+        wrapper.style.border = '1px solid #ccc';
+        wrapper.style.borderRadius = '8px';
+        wrapper.style.padding = '10px';
+        wrapper.style.background = '#fafafa';
+
+        // 圖片
+        const img = new Image();
+        img.loading = 'lazy';
+        img.src = drug.drug_image || '';
+        img.alt = drug.name;
+        img.style.maxWidth = '100%';
+        img.style.maxHeight = '50vh';
+        img.style.objectFit = 'contain';
+        img.style.border = '1px solid #ccc';
+        img.style.borderRadius = '5px';
+        wrapper.appendChild(img);
+
+        // 文字
+        const textArea = document.createElement('div');
+        textArea.style.width = '100%';
+        textArea.style.marginTop = '10px';
+        textArea.style.textAlign = 'left';
+        textArea.innerHTML = `
+    <h3>${drug.name}</h3>
+    <p><strong>適應症：</strong>${drug.symptoms || '無'}</p>
+    <p><strong>注意事項：</strong>${drug.precautions || '無'}</p>
+    <p><strong>副作用：</strong>${drug.side_effects || '無'}</p>
+`;
+        wrapper.appendChild(textArea);
+
+        candidateList.appendChild(wrapper);
+    });
+}
+
+function renderLoadMore(candidateList, payload, nextCursor) {
+    const old = document.getElementById('loadMoreButton');
+    if (old) old.remove();
+    if (!nextCursor) return;
+
+    const btn = document.createElement('button');
+    btn.id = 'loadMoreButton';
+    btn.textContent = '載入更多';
+    btn.style.margin = '10px auto';
+    btn.addEventListener('click', async () => {
+        btn.disabled = true;
+        try {
+            const res = await fetch('/match', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({ ...payload, cursor: nextCursor })
+            });
+            const page = await res.json();
+            if (page.error) {
+                alert("❌ 錯誤訊息：" + page.error);
+                btn.disabled = false;
+                return;
+            }
+            appendCandidates(candidateList, page.candidates || []);
+            renderLoadMore(candidateList, payload, page.next_cursor);
+        } catch (err) {
+            alert("🚨 請求失敗：" + err.message);
+            btn.disabled = false;
+        }
+    });
+    candidateList.appendChild(btn);
+}
+
+
 confirmButton.addEventListener('click', async () => {
     const selectedText = textField.value.trim();
     const selectedColor1 = color1Select.value.trim();
@@ -138,42 +247,8 @@ confirmButton.addEventListener('click', async () => {
             const candidateList = document.getElementById('candidateList');
             candidateList.innerHTML = ''; // 清空
 
-            result.candidates.forEach((drug) => {
-                const wrapper = document.createElement('div');
-                wrapper.style.display = 'flex';
-                wrapper.style.flexDirection = 'column';
-                wrapper.style.alignItems = 'center';
-                wrapper.style.border = '1px solid #ccc';
-                wrapper.style.borderRadius = '8px';
-                wrapper.style.padding = '10px';
-                wrapper.style.background = '#fafafa';
-
-                // 圖片
-                const img = new Image();
-                img.src = drug.drug_image || '';
-                img.alt = drug.name;
-                img.style.maxWidth = '100%';
-                img.style.maxHeight = '50vh';
-                img.style.objectFit = 'contain';
-                img.style.border = '1px solid #ccc';
-                img.style.borderRadius = '5px';
-                wrapper.appendChild(img);
-
-                // 文字
-                const textArea = document.createElement('div');
-                textArea.style.width = '100%';
-                textArea.style.marginTop = '10px';
-                textArea.style.textAlign = 'left';
-                textArea.innerHTML = `
-            <h3>${drug.name}</h3>
-            <p><strong>適應症：</strong>${drug.symptoms || '無'}</p>
-            <p><strong>注意事項：</strong>${drug.precautions || '無'}</p>
-            <p><strong>副作用：</strong>${drug.side_effects || '無'}</p>
-        `;
-                wrapper.appendChild(textArea);
-
-                candidateList.appendChild(wrapper);
-            });
+            appendCandidates(candidateList, result.candidates);
+            renderLoadMore(candidateList, payload, result.next_cursor);
 
             document.getElementById('resultModal').style.display = 'flex';
 
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 VALID_COLORS = [
@@ -8,7 +9,51 @@ VALID_COLORS = [
 VALID_SHAPES = ["圓形", "橢圓形", "其他"]
 
 
-def generate_color_shape_dicts(df: pd.DataFrame, start_index=1, end_index=10000):
+class ColorShapeMasks:
+    """
+    每個顏色 / 外型一個布林遮罩，與 catalog 的列位置對齊（catalog 載入時建一次）
+    顏色取聯集、外型取交集後，np.flatnonzero 就是要交給 matcher 的列位置
+    與「用量排序 isin(候選集合)」完全等價：遮罩本身就是 df["用量排序"].isin(該顏色 / 外型的 id)
+    """
+
+    def __init__(self, n_rows, color, shape):
+        self.n_rows = n_rows
+        self.color = color
+        self.shape = shape
+        self._empty = np.zeros(n_rows, dtype=bool)
+
+    def color_mask(self, color):
+        return self.color.get(color, self._empty)
+
+    def shape_mask(self, shape):
+        return self.shape.get(shape, self._empty)
+
+    def select(self, colors, shape=""):
+        """顏色 OR、外型 AND；回傳列位置（遞增）"""
+        mask = np.zeros(self.n_rows, dtype=bool)
+        for color in colors:
+            mask |= self.color_mask(color)
+        if shape:
+            mask &= self.shape_mask(shape)
+        return np.flatnonzero(mask)
+
+
+def build_color_shape_masks(df: pd.DataFrame, color_dict, shape_dict):
+    """由 generate_color_shape_dicts 的 id 清單建立 ColorShapeMasks"""
+    ranks = df["用量排序"] if "用量排序" in df.columns else pd.Series(np.nan, index=df.index)
+    to_mask = lambda ids: ranks.isin(ids).to_numpy(dtype=bool)
+    return ColorShapeMasks(
+        n_rows=len(df),
+        color={c: to_mask(ids) for c, ids in color_dict.items()},
+        shape={s: to_mask(ids) for s, ids in shape_dict.items()},
+    )
+
+
+def generate_color_shape_dicts(df: pd.DataFrame, start_index=1, end_index=10000, with_masks=False):
+    """
+    回傳 (color_dict, shape_dict, invalid_colors)：{顏色 / 外型: [用量排序, ...]}
+    with_masks=True 時多回傳與列位置對齊的 ColorShapeMasks
+    """
     color_dict = {color: [] for color in VALID_COLORS}
     shape_dict = {shape: [] for shape in VALID_SHAPES}
     invalid_colors = set()
@@ -37,4 +82,6 @@ def generate_color_shape_dicts(df: pd.DataFrame, start_index=1, end_index=10000)
             elif color:
                 invalid_colors.add(color)
 
+    if with_masks:
+        return color_dict, shape_dict, sorted(invalid_colors), build_color_shape_masks(df, color_dict, shape_dict)
     return color_dict, shape_dict, sorted(invalid_colors)
@@ -0,0 +1,123 @@
+# drug_images.py — 參考藥品圖（data/pictures/{批價碼}.jpg）的縮圖產生與網址
+#
+# /match 只回傳 /drug-image/<批價碼> 網址，圖片由瀏覽器另外抓（可被瀏覽器 / proxy 快取），
+# 不再把約 900KB 的原圖 base64 塞進 JSON
+#
+# 圖片來源（依序）：
+#   1. 打包檔 DRUG_IMAGE_PACK（python check_pictures.py 產生，多種解析度，mmap 直接切片回應）
+#   2. 單張縮圖 data/thumbnails（沒有打包檔或打包檔沒有這個批價碼時；第一次請求時自動產生）
+# 預先產生全部單張縮圖：
+#   python -m app.utils.drug_images
+
+import os
+import re
+import threading
+from pathlib import Path
+
+# 相對路徑以啟動時的工作目錄為準，轉成絕對路徑（Flask send_file 會把相對路徑接在 app.root_path 後面）
+PICTURE_ROOT = Path(os.getenv("DRUG_PICTURE_ROOT", "data/pictures")).resolve()
+THUMB_ROOT = Path(os.getenv("DRUG_THUMB_ROOT", "data/thumbnails")).resolve()
+THUMB_MAX_SIDE = int(os.getenv("DRUG_THUMB_MAX_SIDE", "800"))
+THUMB_JPEG_QUALITY = int(os.getenv("DRUG_THUMB_JPEG_QUALITY", "85"))
+DRUG_IMAGE_PACK = Path(os.getenv("DRUG_IMAGE_PACK", "data/drug_images.pack"))
+DEFAULT_VARIANT = "md"  # /match 回傳網址預設的解析度（打包檔的 sizes 之一）
+
+# 批價碼只允許英數、底線、連字號（避免路徑穿越）
+_CODE_RE = re.compile(r"^[A-Za-z0-9_\-]+$")
+_build_lock = threading.Lock()
+_pack_lock = threading.Lock()
+_pack = None
+_pack_loaded = False
+
+
+def get_pack():
+    """打包檔（第一次呼叫時 mmap）；不存在或格式錯誤回傳 None。重新產生打包檔後需重啟服務"""
+    global _pack, _pack_loaded
+    if not _pack_loaded:
+        with _pack_lock:
+            if not _pack_loaded:
+                from app.utils.image_pack import ImagePack
+                if DRUG_IMAGE_PACK.exists():
+                    try:
+                        _pack = ImagePack(DRUG_IMAGE_PACK)
+                        print(f"[IMG] 📦 mmap 圖片打包檔：{DRUG_IMAGE_PACK}（{len(_pack)} 種藥品，{_pack.format}）")
+                    except Exception as e:
+                        print(f"[IMG] ⚠️ 圖片打包檔讀取失敗，改用單張縮圖：{e}")
+                _pack_loaded = True
+    return _pack
+
+
+def is_valid_code(code):
+    return bool(code) and bool(_CODE_RE.match(code))
+
+
+def source_path(code):
+    return PICTURE_ROOT / f"{code}.jpg"
+
+
+def _is_fresh(thumb, src):
+    return thumb.exists() and thumb.stat().st_mtime >= src.stat().st_mtime
+
+
+def build_thumbnail(code):
+    """
+    產生（或沿用已是最新的）縮圖，回傳縮圖路徑；原圖不存在回傳 None
+    - 長邊縮到 THUMB_MAX_SIDE，JPEG 品質 THUMB_JPEG_QUALITY
+    """
+    from PIL import Image, ImageOps
+
+    if not is_valid_code(code):
+        return None
+    src = source_path(code)
+    if not src.exists():
+        return None
+    thumb = THUMB_ROOT / f"{code}.jpg"
+    if _is_fresh(thumb, src):
+        return thumb
+
+    with _build_lock:
+        if _is_fresh(thumb, src):
+            return thumb
+        THUMB_ROOT.mkdir(parents=True, exist_ok=True)
+        with Image.open(src) as img:
+            img.draft("RGB", (THUMB_MAX_SIDE, THUMB_MAX_SIDE))
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            img.thumbnail((THUMB_MAX_SIDE, THUMB_MAX_SIDE), Image.LANCZOS)
+            tmp = thumb.with_suffix(".tmp")
+            img.save(tmp, format="JPEG", quality=THUMB_JPEG_QUALITY, optimize=True, progressive=True)
+        os.replace(tmp, thumb)  # 寫完才換上，避免讀到一半的檔案
+    return thumb
+
+
+def drug_image_url(code):
+    """
+    /match 回傳給前端的圖片網址；沒有圖時回傳空字串
+    網址帶版本（打包檔內容雜湊 / 原圖 mtime），換圖後網址也會變，因此可以放心長時間快取
+    """
+    code = str(code or "").strip()
+    if not is_valid_code(code):
+        return ""
+    pack = get_pack()
+    if pack is not None:
+        etag = pack.etag(code, DEFAULT_VARIANT)
+        if etag:
+            return f"/drug-image/{code}?v={etag}"
+    src = source_path(code)
+    if not src.exists():
+        return ""
+    return f"/drug-image/{code}?v={int(src.stat().st_mtime)}"
+
+
+def build_all_thumbnails():
+    """預先產生 PICTURE_ROOT 下所有 .jpg 的縮圖"""
+    codes = sorted(p.stem for p in PICTURE_ROOT.glob("*.jpg"))
+    built = 0
+    for code in codes:
+        if build_thumbnail(code) is not None:
+            built += 1
+    print(f"✅ 縮圖完成：{built}/{len(codes)} 張 → {THUMB_ROOT}")
+    return built
+
+
+if __name__ == "__main__":
+    build_all_thumbnails()
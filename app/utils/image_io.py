@@ -1,5 +1,36 @@
+def _draft_size(size, max_side):
+    """draft 要求的大小：等比例縮到長邊 = max_side（draft 只會縮到「不小於」這個大小）"""
+    w, h = size
+    s = max_side / max(w, h)
+    return max(1, int(w * s)), max(1, int(h * s))
 
-def read_image_safely(img_path):
+
+def open_image_scaled(fp, max_side=0, exif_transpose=False):
+    """
+    用 Pillow 開圖並在解碼時就縮小（scale-on-decode），回傳 RGB 的 PIL Image
+    - fp: 路徑或 file-like（例如 io.BytesIO）
+    - max_side > 0 且原圖較大時：
+        JPEG → draft() 以 DCT 縮放直接解出 1/2、1/4、1/8 尺寸（長邊仍 ≥ max_side）
+        HEIC → pillow-heif 的 draft() 改解內嵌縮圖（有夠大的縮圖才會用，否則解原圖）
+    - exif_transpose: 依 EXIF 轉正（與 cv2.imread 讀 JPEG 的行為一致）
+    """
+    from PIL import Image, ImageOps
+    import pillow_heif
+    pillow_heif.register_heif_opener()
+
+    img = Image.open(fp)
+    if max_side > 0 and max(img.size) > max_side:
+        img.draft("RGB", _draft_size(img.size, max_side))
+    if exif_transpose:
+        img = ImageOps.exif_transpose(img)
+    return img.convert("RGB")
+
+
+def read_image_safely(img_path, max_side=0):
+    """
+    讀圖回傳 BGR ndarray，失敗回傳 None
+    - max_side > 0：scale-on-decode（見 open_image_scaled），解出的長邊介於 max_side ~ 2×max_side
+    """
     from pathlib import Path
     from PIL import Image
     import cv2
@@ -16,11 +47,14 @@ def read_image_safely(img_path):
         suffix = img_path.suffix.lower()
         if suffix in {".heic", ".heif"}:
             # print(f"📄 使用 PIL 讀取 HEIC 圖片：{img_path}")
-            pil_img = Image.open(img_path).convert("RGB")
+            pil_img = open_image_scaled(img_path, max_side=max_side)
             np_img = np.array(pil_img)
             if np_img is None:
                 print("⚠️ PIL 無法轉成 numpy")
             return cv2.cvtColor(np_img, cv2.COLOR_RGB2BGR)
+        elif max_side > 0 and suffix in {".jpg", ".jpeg"}:
+            # JPEG 縮小解碼：PIL draft（cv2.imread 會套用 EXIF 方向，這裡也一樣）
+            return pil_to_bgr(open_image_scaled(img_path, max_side=max_side, exif_transpose=True))
         else:
             # print(f"📄 使用 OpenCV 讀取圖片：{img_path}")
             img = cv2.imread(str(img_path))
@@ -30,3 +64,49 @@ def read_image_safely(img_path):
     except Exception as e:
         print(f"❌ 圖片讀取錯誤：{img_path} ➜ {e}")
         return None
+
+
+def resize_to_max_side(img, max_side, interpolation=None):
+    """
+    等比例縮小到長邊 ≤ max_side（不放大；預設 INTER_AREA）
+    - max_side <= 0 或原圖已夠小：直接回傳原圖（不複製）
+    """
+    import cv2
+
+    if interpolation is None:
+        interpolation = cv2.INTER_AREA
+    h, w = img.shape[:2]
+    if max_side <= 0 or max(h, w) <= max_side:
+        return img
+    s = max_side / max(h, w)
+    new_w, new_h = max(1, int(round(w * s))), max(1, int(round(h * s)))
+    return cv2.resize(img, (new_w, new_h), interpolation=interpolation)
+
+
+def pil_to_bgr(pil_img):
+    """RGB 的 PIL Image → OpenCV BGR ndarray"""
+    import cv2
+    import numpy as np
+
+    return cv2.cvtColor(np.asarray(pil_img), cv2.COLOR_RGB2BGR)
+
+
+def load_image(source, max_side=0):
+    """
+    統一的讀圖入口，回傳 BGR ndarray（失敗回傳 None）
+    - str / Path：read_image_safely（JPEG 套用 EXIF 方向）
+    - bytes / bytearray / memoryview：直接在記憶體解碼（Pillow，支援 HEIC），不寫暫存檔
+    - np.ndarray：視為已解碼的 BGR 影像，原樣回傳
+    """
+    import io
+    import numpy as np
+
+    if isinstance(source, np.ndarray):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        try:
+            return pil_to_bgr(open_image_scaled(io.BytesIO(source), max_side=max_side))
+        except Exception as e:
+            print(f"❌ 圖片解碼錯誤（bytes，{len(source)} B）➜ {e}")
+            return None
+    return read_image_safely(source, max_side=max_side)
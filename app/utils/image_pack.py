@@ -0,0 +1,105 @@
+# image_pack.py — 參考藥品圖打包檔（check_pictures.py 產生，伺服器以 mmap 讀取）
+#
+# 檔案格式（little-endian）：
+#   [MAGIC 8B][版本 u32][保留 u32]
+#   [圖片 blob ...]                       ← 每個批價碼 × 每種解析度一段，連續存放
+#   [索引 JSON（utf-8）]
+#   [索引 offset u64][索引長度 u64][MAGIC 8B]
+# 索引 JSON：
+#   {"format": "jpeg"|"webp", "sizes": {"sm": 320, ...},
+#    "items": {批價碼: {"mtime": 原圖 mtime, "variants": {"sm": [offset, length, etag], ...}}}}
+#
+# 伺服器端 mmap 整個檔案，回應時切 memoryview 再轉成 bytes（只複製單張圖、不開小檔），
+# 各 gunicorn worker 讀的是同一份 page cache
+
+import hashlib
+import json
+import mmap
+import struct
+
+MAGIC = b"PILLPACK"
+VERSION = 1
+_HEADER = struct.Struct("<8sII")
+_FOOTER = struct.Struct("<QQ8s")
+MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+class ImagePackWriter:
+    """
+    寫入打包檔：
+        with ImagePackWriter(path, fmt="jpeg", sizes={"sm": 320}) as w:
+            w.add(code, "sm", data, mtime)
+    相同內容（例如原圖小於目標解析度）只存一份
+    """
+
+    def __init__(self, path, fmt, sizes):
+        if fmt not in MIME_TYPES:
+            raise ValueError(f"fmt must be one of {list(MIME_TYPES)}")
+        self.path = path
+        self.index = {"format": fmt, "sizes": dict(sizes), "items": {}}
+        self._by_digest = {}
+        self._f = None
+
+    def __enter__(self):
+        self._f = open(self.path, "wb")
+        self._f.write(_HEADER.pack(MAGIC, VERSION, 0))
+        return self
+
+    def add(self, code, variant, data, mtime):
+        digest = hashlib.sha1(data).hexdigest()
+        if digest not in self._by_digest:
+            self._by_digest[digest] = (self._f.tell(), len(data))
+            self._f.write(data)
+        offset, length = self._by_digest[digest]
+        item = self.index["items"].setdefault(code, {"mtime": mtime, "variants": {}})
+        item["variants"][variant] = [offset, length, digest[:16]]
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                index_offset = self._f.tell()
+                raw = json.dumps(self.index, ensure_ascii=False).encode("utf-8")
+                self._f.write(raw)
+                self._f.write(_FOOTER.pack(index_offset, len(raw), MAGIC))
+        finally:
+            self._f.close()
+        return False
+
+
+class ImagePack:
+    """唯讀 mmap 打包檔；get() 回傳的 memoryview 直接指向 mmap，不複製"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _ = _HEADER.unpack_from(self._mm, 0)
+        index_offset, index_len, tail = _FOOTER.unpack_from(self._mm, len(self._mm) - _FOOTER.size)
+        if magic != MAGIC or tail != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"不是有效的圖片打包檔：{self.path}")
+        self.index = json.loads(self._mm[index_offset:index_offset + index_len].decode("utf-8"))
+        self.format = self.index["format"]
+        self.mimetype = MIME_TYPES[self.format]
+        self.sizes = self.index["sizes"]
+        self._view = memoryview(self._mm)
+
+    def __contains__(self, code):
+        return code in self.index["items"]
+
+    def __len__(self):
+        return len(self.index["items"])
+
+    def get(self, code, variant):
+        """回傳 (memoryview, etag, mtime)；沒有這張圖或解析度時回傳 None"""
+        item = self.index["items"].get(code)
+        if item is None or variant not in item["variants"]:
+            return None
+        offset, length, etag = item["variants"][variant]
+        return self._view[offset:offset + length], etag, item["mtime"]
+
+    def etag(self, code, variant):
+        item = self.index["items"].get(code)
+        if item is None or variant not in item["variants"]:
+            return None
+        return item["variants"][variant][2]
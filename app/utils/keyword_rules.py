@@ -0,0 +1,137 @@
+# keyword_rules.py — OCR 關鍵字規則（藥袋文字、商品名 → 批價碼）
+#
+# 規則表：data/keyword_rules.json（KEYWORD_RULES_PATH 可改），每條規則：
+#   {"keywords": ["ACETYLCYSTEINE", "ACTEIN"], "drug_id": "OACE1",
+#    "text": "藥袋特例", "match": "ACETYLCYSTEINE / ACTEIN"}
+# - keywords: OCR 文字（全部片段串接、轉大寫）中出現任一個就命中
+# - drug_id: 命中時直接回傳的批價碼；text / match: 回傳結果中顯示的欄位（可省略）
+# 多條規則同時命中時，以規則表中較前面的為準
+#
+# catalog 載入時把所有關鍵字編成一個 Aho–Corasick 自動機、批價碼先對好列位置，
+# 每個請求只需對 OCR 字串線性掃描一次，規則再多也不必掃 DataFrame
+# 新增規則：編輯 JSON 後重啟服務
+
+import json
+import os
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+KEYWORD_RULES_PATH = Path(os.getenv("KEYWORD_RULES_PATH", "data/keyword_rules.json"))
+
+
+class AhoCorasick:
+    """多字串比對自動機；search(text) 回傳 text 中出現過的 pattern 編號（集合）"""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for pid, pattern in enumerate(patterns):
+            node = 0
+            for ch in pattern:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[node][ch] = nxt
+                node = nxt
+            self.out[node].append(pid)
+
+        # BFS 建 failure link；輸出沿 failure link 合併（短 pattern 是長 pattern 的後綴時也會被找到）
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def search(self, text):
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            if self.out[node]:
+                found.update(self.out[node])
+        return found
+
+
+class KeywordRuleEngine:
+    """
+    編譯好的規則表（對應某個 catalog DataFrame）：
+    - rules[i]: {"text", "match", "drug_id", "positions"}，positions 為該批價碼在 catalog 的列位置（遞增）
+    - match(text, positions=None) → (規則, 列位置) 或 None；positions 為顏色 / 外型篩選後的列位置
+    """
+
+    def __init__(self, rules, df):
+        codes = df["批價碼"] if "批價碼" in df.columns else [None] * len(df)
+        pos_by_code = {}
+        for p, code in enumerate(codes):
+            if isinstance(code, str) and code.strip():
+                pos_by_code.setdefault(code.strip(), []).append(p)
+
+        self.rules = []
+        patterns, self._pattern_rule = [], []
+        for rule in rules:
+            drug_id = str(rule.get("drug_id", "")).strip()
+            keywords = [str(kw).strip().upper() for kw in rule.get("keywords", []) if str(kw).strip()]
+            if drug_id not in pos_by_code:
+                print(f"[RULE] ⚠️ 規則 {keywords} 的批價碼 {drug_id} 不在 catalog 中，略過")
+                continue
+            for kw in keywords:
+                patterns.append(kw)
+                self._pattern_rule.append(len(self.rules))
+            self.rules.append({
+                "text": rule.get("text", "關鍵字規則"),
+                "match": rule.get("match", " / ".join(keywords)),
+                "drug_id": drug_id,
+                "positions": np.array(pos_by_code[drug_id], dtype=np.int64),
+            })
+        self.automaton = AhoCorasick(patterns)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, text, positions=None):
+        if not self.rules:
+            return None
+        hit = sorted({self._pattern_rule[pid] for pid in self.automaton.search(text.upper())})
+        for r in hit:
+            rule = self.rules[r]
+            cand = rule["positions"]
+            if positions is not None:
+                cand = cand[np.isin(cand, positions)]
+            if len(cand):
+                return rule, int(cand[0])
+        return None
+
+
+@lru_cache(maxsize=None)
+def load_rule_table(path=KEYWORD_RULES_PATH):
+    """讀規則表（同一路徑只讀一次）；檔案不存在或格式錯誤時回傳空的規則表"""
+    path = Path(path)
+    if not path.exists():
+        return ()
+    try:
+        with open(path, encoding="utf-8") as f:
+            rules = json.load(f)
+    except Exception as e:
+        print(f"[RULE] ⚠️ 關鍵字規則讀取失敗：{path}：{e}")
+        return ()
+    print(f"[RULE] 📋 載入 {len(rules)} 條關鍵字規則：{path}")
+    return tuple(rules)
+
+
+def build_keyword_rules(df, rules=None):
+    """rules 省略時使用 KEYWORD_RULES_PATH 的規則表"""
+    return KeywordRuleEngine(load_rule_table() if rules is None else rules, df)
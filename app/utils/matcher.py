@@ -1,4 +1,23 @@
+import heapq
 import itertools
+import math
+import os
+
+import numpy as np
+
+from app.utils.keyword_rules import build_keyword_rules
+
+# 逐筆比對的 debug 輸出（每個請求會印上千行，預設關閉）
+MATCHER_DEBUG = os.getenv("MATCHER_DEBUG", "0") == "1"
+# 每個請求最多評估幾種 OCR 片段排列（硬上限，需要時才設定；預設不設 = 永遠窮舉，結果與改寫前相同）：
+# 片段數 k 的 k! ≤ 上限時照舊窮舉全部排列，超過時改用寬度為上限的 beam search
+# beam search 是近似的：例如上限 120 時，k ≥ 6 的最佳分數偶爾低於完整窮舉，可能換掉勝出的藥品
+# （見 benchmarks/check_fragment_orderings.py）；只在片段數多、延遲比準確度重要時開啟
+MATCH_MAX_ORDERINGS = int(os.getenv("MATCH_MAX_ORDERINGS") or 0) or math.inf
+# 算 LCS 之前先用字元倒排索引刪掉不可能達標的刻字（結果不變，只省計算）
+MATCH_PRUNE = os.getenv("MATCH_PRUNE", "1") == "1"
+# 分數低於此值的刻字不列入 top-N 候選，也不當作「不達門檻時最接近的結果」
+CANDIDATE_FLOOR = 0.5
 
 
 # LCS 相似度計算（忽略大小寫）
@@ -17,148 +36,509 @@ def lcs_score(a: str, b: str) -> float:
     return lcs_len / max(m, n)
 
 
-def match_ocr_to_front_back_by_permuted_ocr(ocr_texts, df, threshold=0.8):
-    best_front = {"score": 0.0, "text": "", "match": None, "row": None}
-    best_back = {"score": 0.0, "text": "", "match": None, "row": None}
-
-    # === 特例：藥袋內容快速比對 ===
-    combined_all = ''.join(ocr_texts).upper()
-    keywords = {"ACETYLCYSTEINE", "ACTEIN"}
-    if any(kw in combined_all for kw in keywords):
-        # print("🚀 偵測到藥袋特例（ACETYLCYSTEINE 或 ACTEIN），直接比對學名")#註解SSS
-        matched_rows = df[df["文字"].str.contains("ACETYLCYSTEINE|ACTEIN", case=False, na=False)]
-        if not matched_rows.empty:
-            match_row = matched_rows.iloc[0]
-            return {
-                "front": {
-                    "score": 1.0,
-                    "text": "藥袋特例",
-                    "match": "ACETYLCYSTEINE / ACTEIN",
-                    "row": match_row
-                }
-            }
+def _lcs_len_bitparallel(pm, m, text):
+    """
+    單一字串的 bit-parallel LCS 長度（Allison–Dix / Hyyrö）；Python int 不限長度
+    - pm: {字元: 在 pattern 中出現位置的 bitmask}，m: pattern 長度
+    """
+    mask = (1 << m) - 1
+    v = mask
+    for ch in text:
+        u = v & pm.get(ch, 0)
+        v = ((v + u) | (v - u)) & mask
+    return m - bin(v).count("1")
+
+
+class BitParallelLCS:
+    """
+    一組固定字串（例如所有正面刻字）的 bit-parallel LCS：
+    每個字串的字元 bitmask 在建立時算好，scores(query) 一次算出 query 對全部字串的
+    lcs_score(query, s)，結果與 lcs_score 完全相同（同樣忽略大小寫、同樣除以 max(m, n)）
+    - 長度 ≤ 64 的字串以 numpy uint64 向量化；更長的字串（目前 catalog 沒有）逐一以 Python int 計算
+    - 空字串的分數為 0.0（matcher 本來就會跳過空的刻字）
+    """
+
+    WORD_BITS = 64
+
+    def __init__(self, strings):
+        lowered = [s.lower() for s in strings]
+        self.lengths = np.array([len(s) for s in lowered], dtype=np.int64)
+        self._alphabet = {}
+        for s in lowered:
+            for ch in s:
+                self._alphabet.setdefault(ch, len(self._alphabet))
+
+        self._vec = np.flatnonzero((self.lengths > 0) & (self.lengths <= self.WORD_BITS))
+        # _pm[字元 id, k] = 第 k 個向量化字串中該字元出現位置的 bitmask
+        self._pm = np.zeros((len(self._alphabet), len(self._vec)), dtype=np.uint64)
+        for k, i in enumerate(self._vec):
+            for bit, ch in enumerate(lowered[i]):
+                self._pm[self._alphabet[ch], k] |= np.uint64(1 << bit)
+        self._vec_mask = np.array([(1 << int(m)) - 1 for m in self.lengths[self._vec]], dtype=np.uint64)
+        # 字串位置 → 向量化 lane（不在向量化範圍內為 -1）
+        self._lane = np.full(len(self.lengths), -1, dtype=np.int64)
+        self._lane[self._vec] = np.arange(len(self._vec))
+
+        self._long = []
+        for i in np.flatnonzero(self.lengths > self.WORD_BITS):
+            pm = {}
+            for bit, ch in enumerate(lowered[i]):
+                pm[ch] = pm.get(ch, 0) | (1 << bit)
+            self._long.append((int(i), pm))
+
+    def initial_state(self, rows=1):
+        """向量化字串的初始 V（全 1）；rows 列代表 rows 個平行的 query 前綴"""
+        return np.full((rows, len(self._vec)), np.iinfo(np.uint64).max, dtype=np.uint64)
+
+    def advance(self, v, text):
+        """把 text 接在 v 所代表的 query 後面，回傳新的 V（v 的形狀不限，最後一維對應向量化字串）"""
+        with np.errstate(over="ignore"):
+            for ch in text.lower():
+                cid = self._alphabet.get(ch)
+                if cid is None:
+                    continue  # 沒出現在任何字串的字元：U = 0，V 不變
+                u = v & self._pm[cid]
+                v = (v + u) | (v - u)
+        return v
+
+    def state_lcs(self, v):
+        """V → 目前 query 前綴對各向量化字串的 LCS 長度（低 m 位元中 0 的個數）"""
+        zeros = np.ascontiguousarray(~v & self._vec_mask)
+        bits = np.unpackbits(zeros.view(np.uint8), axis=-1)
+        return bits.reshape(*zeros.shape, 64).sum(axis=-1)
+
+    def restrict(self, subset):
+        """只含 subset 這些字串位置的 BitParallelLCS（共用字元表，bitmask 只切一次，之後可重複查詢）"""
+        subset = np.asarray(subset, dtype=np.int64)
+        sub = object.__new__(BitParallelLCS)
+        sub.lengths = self.lengths[subset]
+        sub._alphabet = self._alphabet
+        lanes = self._lane[subset]
+        sub._vec = np.flatnonzero(lanes >= 0)
+        sub._pm = self._pm[:, lanes[sub._vec]]
+        sub._vec_mask = self._vec_mask[lanes[sub._vec]]
+        sub._lane = np.full(len(subset), -1, dtype=np.int64)
+        sub._lane[sub._vec] = np.arange(len(sub._vec))
+        long_pm = dict(self._long)
+        sub._long = [(k, long_pm[i]) for k, i in enumerate(subset.tolist()) if i in long_pm]
+        return sub
+
+    def lcs_lengths(self, query, subset=None):
+        """query 對每個字串（或 subset 指定的字串位置，順序與 subset 相同）的 LCS 長度（int64 陣列）"""
+        if subset is not None:
+            return self.restrict(subset).lcs_lengths(query)
+        query = query.lower()
+        out = np.zeros(len(self.lengths), dtype=np.int64)
+        out[self._vec] = self.state_lcs(self.advance(self.initial_state()[0], query))
+        for i, pm in self._long:
+            out[i] = _lcs_len_bitparallel(pm, int(self.lengths[i]), query)
+        return out
+
+    def scores(self, query, subset=None):
+        """lcs_score(query, s) 的向量版（float64 陣列；給 subset 時只算那些位置，順序與 subset 相同）"""
+        if subset is not None:
+            return self.restrict(subset).scores(query)
+        n = len(query.lower())
+        denom = np.maximum(self.lengths, n)
+        scores = np.zeros(len(self.lengths), dtype=np.float64)
+        nz = denom > 0
+        scores[nz] = self.lcs_lengths(query)[nz] / denom[nz]
+        scores[self.lengths == 0] = 0.0
+        return scores
+
+
+class CharCountFilter:
+    """
+    刻字的字元倒排索引（catalog 載入時建一次），在算 LCS 之前先刪掉不可能達標的刻字：
+    - postings[(c, t)]: 字元 c 至少出現 t 次的字串位置
+    - 查詢時把 query 每個字元 c（出現 q 次）的 postings[(c, 1..q)] 合併計數，
+      得到 Σ_c min(query 中 c 的次數, 刻字中 c 的次數) —— 這是 LCS 長度的上界
+    - 上界 / max(m, n) < floor 的刻字，真正的 lcs_score 也一定 < floor，可以放心刪掉
+    上界只看字元多重集合與長度，跟 OCR 片段的排列順序無關，所以每個請求只要算一次
+    （trigram 之類的連續 n-gram 不適用：LCS 是子序列，0.5 門檻下兩字串可以完全沒有共同的 trigram）
+    """
+
+    def __init__(self, strings):
+        lowered = [s.lower() for s in strings]
+        self.lengths = np.array([len(s) for s in lowered], dtype=np.int64)
+        postings = {}
+        for i, s in enumerate(lowered):
+            counts = {}
+            for ch in s:
+                counts[ch] = counts.get(ch, 0) + 1
+            for ch, cnt in counts.items():
+                for t in range(1, cnt + 1):
+                    postings.setdefault((ch, t), []).append(i)
+        self.postings = {key: np.array(ids, dtype=np.int64) for key, ids in postings.items()}
+
+    def upper_bounds(self, query):
+        """(有共同字元的字串位置, 各自的 LCS 長度上界)；沒有共同字元的字串上界為 0，不列出"""
+        counts = {}
+        for ch in query.lower():
+            counts[ch] = counts.get(ch, 0) + 1
+        lists = [self.postings[(ch, t)] for ch, q in counts.items() for t in range(1, q + 1)
+                 if (ch, t) in self.postings]
+        if not lists:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        hits = np.bincount(np.concatenate(lists), minlength=len(self.lengths))
+        ids = np.flatnonzero(hits)
+        return ids, hits[ids]
+
+    def candidates(self, query, floor):
+        """lcs_score(query, s) 可能 ≥ floor 且 > 0 的字串位置（遞增排序）"""
+        ids, upper = self.upper_bounds(query)
+        denom = np.maximum(self.lengths[ids], len(query.lower()))
+        return ids[upper / denom >= floor]
+
+
+def parse_imprint(text_field):
+    """「F:...|B:...」→ (正面文字, 背面文字)，皆轉大寫；沒有該面時為空字串"""
+    front_text, back_text = "", ""
+    for p in str(text_field).strip().split('|'):
+        if ':' in p:
+            k, v = p.split(':', 1)
+            key = k.strip().upper()
+            val = v.strip().upper()
+            if key == "F":
+                front_text = val
+            elif key == "B":
+                back_text = val
+    return front_text, back_text
+
+
+class ImprintIndex:
+    """
+    預先解析好的刻字索引（catalog 載入時建一次，之後每個請求共用）：
+    - labels: DataFrame 的 index（用來把 df_sub 對回索引位置、以及最後取回 row）
+    - front / back: 每列的正面 / 背面刻字（大寫，平行陣列）
+    - has_text: 至少有一面刻字的遮罩
+    - front_lcs / back_lcs: 正面 / 背面刻字的 bit-parallel LCS（字元 bitmask 預先算好）
+    - front_filter / back_filter: 正面 / 背面刻字的字元倒排索引（候選剪枝用）
+    - keyword_rules: 編譯好的關鍵字規則（藥袋文字 / 商品名 → 批價碼，見 keyword_rules.py）
+    """
+
+    def __init__(self, labels, front, back, keyword_rules=None):
+        self.labels = labels
+        self.front = front
+        self.back = back
+        self.has_text = np.array([bool(f or b) for f, b in zip(front, back)], dtype=bool)
+        self.front_lcs = BitParallelLCS(front)
+        self.back_lcs = BitParallelLCS(back)
+        self.front_filter = CharCountFilter(front)
+        self.back_filter = CharCountFilter(back)
+        self.keyword_rules = keyword_rules
+
+    def __len__(self):
+        return len(self.front)
+
+    def positions_for(self, df):
+        """df（通常是顏色/外型篩選後的 df_sub）各列在索引中的位置；對不上時回傳 None"""
+        if not self.labels.is_unique:
+            return None
+        pos = self.labels.get_indexer(df.index)
+        if (pos < 0).any():
+            return None
+        return pos
+
+
+def build_imprint_index(df, rules=None):
+    """rules: 關鍵字規則表（省略時讀 KEYWORD_RULES_PATH）"""
+    texts = df["文字"] if "文字" in df.columns else [""] * len(df)
+    parsed = [parse_imprint(t) for t in texts]
+    return ImprintIndex(
+        labels=df.index,
+        front=[f for f, _ in parsed],
+        back=[b for _, b in parsed],
+        keyword_rules=build_keyword_rules(df, rules),
+    )
+
+
+# === 比對範圍 / 候選 / 排列：matcher 與融合排序（multimodal.py）共用的公開 API ===
+def scope_positions(df, index, positions=None):
+    """
+    回傳 (索引, 這次請求涵蓋的列位置)；沒有傳入索引或對不上 df 時就地建一個
+    positions: 已篩好的列位置（對應 df 與 index，例如顏色 / 外型遮罩的結果）
+    """
+    if positions is not None:
+        if index is None or len(index) != len(df):
+            index = build_imprint_index(df)
+        pos = np.asarray(positions, dtype=np.int64)
+    else:
+        pos = index.positions_for(df) if index is not None else None
+        if pos is None:
+            index = build_imprint_index(df)
+            pos = np.arange(len(index))
+    return index, pos
+
+
+def candidate_positions(df, index, positions=None):
+    """回傳 (索引, 要比對刻字的位置陣列)：scope_positions 中有刻字的列"""
+    index, pos = scope_positions(df, index, positions)
+    return index, pos[index.has_text[pos]]
+
+
+def side_candidates(index, positions, ocr_texts, floor):
+    """
+    回傳 (正面候選位置, 背面候選位置)：positions 中該面有刻字、且分數可能 ≥ floor（並 > 0）的位置
+    MATCH_PRUNE 關閉時只排除沒有刻字的那一面
+    """
+    if not MATCH_PRUNE:
+        return (positions[index.front_lcs.lengths[positions] > 0],
+                positions[index.back_lcs.lengths[positions] > 0])
+    combined = ''.join(ocr_texts).upper()
+    return tuple(np.intersect1d(f.candidates(combined, floor), positions, assume_unique=True)
+                 for f in (index.front_filter, index.back_filter))
+
+
+def row_at(df, index, p):
+    """索引位置 p 對應的 df 整列"""
+    return df.loc[index.labels[p]]
+
+
+def _beam_orderings(fragments, engines, width):
+    """
+    不窮舉排列，以 beam search 挑出最多 width 種片段排列（回傳片段位置的 tuple）：
+    - engines: 只含這次請求候選刻字的 BitParallelLCS（正面、背面；restrict 過），狀態大小與候選數成正比
+    - 逐層把每個未用過的片段接在 beam 裡的前綴後面，所有前綴一起以 bit-parallel 狀態向量化推進
+    - 用過的片段集合相同、LCS 狀態也完全相同的前綴，接下來的結果必然相同 → 只留一個（subset DP 式剪枝）
+    - 超過 width 時，優先保留「在越多刻字上達到目前最長 LCS」的前綴，其次看 LCS 總和
+    每層最多 width × k 個候選，總成本約 width × k² × 候選數，與排列數 k! 無關
+    這是近似搜尋：被剪掉的前綴可能才是最佳排列，最佳分數不保證與完整窮舉相同
+    """
+    beam = [((), 0)]
+    states = [e.initial_state() for e in engines]
+    for _ in range(len(fragments)):
+        cand, cand_states, seen = [], [[] for _ in engines], set()
+        for i, frag in enumerate(fragments):
+            sel = [b for b, (_, used) in enumerate(beam) if not used >> i & 1]
+            if not sel:
+                continue
+            advanced = [e.advance(st[sel], frag) for e, st in zip(engines, states)]
+            for j, b in enumerate(sel):
+                order, used = beam[b]
+                key = (used | 1 << i,) + tuple(a[j].tobytes() for a in advanced)
+                if key in seen:
+                    continue
+                seen.add(key)
+                cand.append((order + (i,), used | 1 << i))
+                for cs, a in zip(cand_states, advanced):
+                    cs.append(a[j])
+        cand_states = [np.array(cs, dtype=np.uint64).reshape(len(cand), -1) for cs in cand_states]
+
+        if len(cand) > width:
+            lcs = np.hstack([e.state_lcs(st) for e, st in zip(engines, cand_states)])
+            best = lcs.max(axis=0)
+            merit = ((lcs == best) & (best > 0)).sum(axis=1)
+            keep = np.lexsort((-lcs.sum(axis=1), -merit))[:width]
+            cand = [cand[k] for k in keep]
+            cand_states = [st[keep] for st in cand_states]
+        beam, states = cand, cand_states
+    return [order for order, _ in beam]
+
+
+def fragment_orderings(ocr_texts, index, candidates, max_orderings=None):
+    """
+    要評估的 OCR 串接文字（list）：
+    - k! ≤ max_orderings：照舊依 itertools.permutations 的順序窮舉
+    - 否則：_beam_orderings 挑出的至多 max_orderings 種排列（近似，可能漏掉完整窮舉的最佳排列）
+    candidates: (正面候選位置, 背面候選位置)，beam search 只看這些刻字（顏色 / 外型篩選與字元剪枝之後）
+    """
+    max_orderings = MATCH_MAX_ORDERINGS if max_orderings is None else max_orderings
+    if math.factorial(len(ocr_texts)) <= max_orderings:
+        return [''.join(perm).upper() for perm in itertools.permutations(ocr_texts)]
+    fragments = [t.upper() for t in ocr_texts]
+    engines = (index.front_lcs.restrict(candidates[0]), index.back_lcs.restrict(candidates[1]))
+    return [''.join(fragments[i] for i in order)
+            for order in _beam_orderings(fragments, engines, max(1, max_orderings))]
+
+
+def keyword_rule_hit(ocr_texts, df, index=None, positions=None):
+    """
+    關鍵字規則（例如藥袋上的 ACETYLCYSTEINE / ACTEIN）：OCR 串接文字掃描一次
+    命中時回傳 (索引, 規則, 列位置)，列位置限於這次請求涵蓋的列；沒有命中回傳 None
+    """
+    index, scope = scope_positions(df, index, positions)
+    if index.keyword_rules is None:
+        return None
+    hit = index.keyword_rules.match(''.join(ocr_texts).upper(), scope)
+    if hit is None:
+        return None
+    rule, p = hit
+    return index, rule, p
+
+
+def _keyword_result(df, hit):
+    """規則命中時回傳的比對結果（分數 1.0）"""
+    index, rule, p = hit
+    return {"score": 1.0, "text": rule["text"], "match": rule["match"], "row": row_at(df, index, p)}
+
+
+class _SinglePass:
+    """
+    一次掃描同時得到：
+    - top: 分數 ≥ CANDIDATE_FLOOR 的前 top_n 筆（大小為 top_n 的 heap；同分時先比對到的在前，
+      與改寫前「全部收集再 sorted」的順序相同）
+    - best: 每一面分數最高的一筆（同分時取先比對到的，與改寫前的 > 比較相同）
+    比對順序為（排列, 列位置, 正面 → 背面）；scan() 可以分批呼叫，順序以這個 key 決定，不受分批影響
+    """
+
+    def __init__(self, index, orderings, top_n):
+        self.index = index
+        self.orderings = orderings
+        self.top_n = top_n
+        self.heap = []
+        self.count = 0
+        self.best = {"front": None, "back": None}  # side → (score, 排列序號, 列位置)
+
+    def _consider_best(self, side, score, o, p):
+        cur = self.best[side]
+        if score > 0.0 and (cur is None or score > cur[0] or (score == cur[0] and (o, p) < cur[1:])):
+            self.best[side] = (score, o, p)
+
+    def _consider_top(self, score, o, p, side):
+        if self.top_n <= 0 or score < CANDIDATE_FLOOR:
+            return
+        # count 遞增 → 同分時 -count 越大代表越早加入；heap 頂端是目前最差的一筆
+        item = (score, -self.count, o, p, side)
+        self.count += 1
+        if len(self.heap) < self.top_n:
+            heapq.heappush(self.heap, item)
+        elif item[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, item)
+
+    def scan(self, cand_f, cand_b):
+        """cand_f / cand_b: 遞增排序的正面 / 背面候選位置"""
+        if len(cand_f) == 0 and len(cand_b) == 0:
+            return
+        lcs_f = self.index.front_lcs.restrict(cand_f)
+        lcs_b = self.index.back_lcs.restrict(cand_b)
+        for o, combined_ocr in enumerate(self.orderings):
+            # 一次算出對全部候選刻字的 LCS 分數（與 lcs_score 相同）
+            sides = (("front", cand_f, lcs_f.scores(combined_ocr), self.index.front),
+                     ("back", cand_b, lcs_b.scores(combined_ocr), self.index.back))
+            if MATCHER_DEBUG:
+                for side, cand, scores, texts in sides:
+                    for p, score in zip(cand.tolist(), scores.tolist()):
+                        print(f"[DEBUG-{side[0].upper()}] 比對 {combined_ocr} ↔ {texts[p]} ➜ score = {score:.3f}")
+
+            hits = []
+            for rank, (side, cand, scores, _) in enumerate(sides):
+                if len(scores) == 0:
+                    continue
+                k = int(np.argmax(scores))  # 同分取第一個 = 列位置最小
+                self._consider_best(side, float(scores[k]), o, int(cand[k]))
+                if self.top_n > 0:
+                    hits.extend((int(cand[k]), rank, float(scores[k]))
+                                for k in np.flatnonzero(scores >= CANDIDATE_FLOOR))
+            # 依（列位置, 正面 → 背面）的比對順序放進 heap
+            for p, rank, score in sorted(hits):
+                self._consider_top(score, o, p, sides[rank][0])
+
+    def top(self, df):
+        """依分數由高到低；只對回傳的列取回整列資料"""
+        items = sorted(self.heap, key=lambda it: (-it[0], -it[1]))
+        return [{
+            "score": score,
+            "text": self.orderings[o],
+            "match": (self.index.front if side == "front" else self.index.back)[p],
+            "row": row_at(df, self.index, p),
+            "side": side,
+        } for score, _, o, p, side in items]
+
+    def best_side(self, df, side):
+        """{"score", "text", "match", "row"}；這一面沒有任何分數 > 0 的刻字時 row 為 None"""
+        if self.best[side] is None:
+            return {"score": 0.0, "text": "", "match": None, "row": None}
+        score, o, p = self.best[side]
+        texts = self.index.front if side == "front" else self.index.back
+        return {"score": score, "text": self.orderings[o], "match": texts[p], "row": row_at(df, self.index, p)}
+
+
+def _single_pass(ocr_texts, df, index, positions, max_orderings, top_n, floor, fallback=False):
+    """
+    floor: 第一批只比對分數可能 ≥ floor 的刻字
+    fallback: 第一批沒有任何分數 ≥ CANDIDATE_FLOOR 時，再補比對其餘分數可能 > 0 的刻字（不重算第一批）
+    """
+    index, positions = candidate_positions(df, index, positions)
+    first = side_candidates(index, positions, ocr_texts, floor)
+    state = _SinglePass(index, fragment_orderings(ocr_texts, index, first, max_orderings), top_n)
+    state.scan(*first)
+    if fallback and not state.heap and floor > 0.0:
+        rest = side_candidates(index, positions, ocr_texts, 0.0)
+        state.scan(*(np.setdiff1d(r, f, assume_unique=True) for r, f in zip(rest, first)))
+    return state
+
+
+def match_ocr(ocr_texts, df, threshold=0.8, top_n=3, index=None, max_orderings=None, positions=None):
+    """
+    /match 用的單次比對：top-N、各面最佳結果、門檻判斷一起算，不必再以 threshold=0.0 重掃一次
+    回傳 dict：
+    - top: 與 match_top_n_ocr_to_front_back 相同的前 top_n 筆（沒有任何分數 ≥ CANDIDATE_FLOOR 時為空）
+    - best: {"front": ..., "back": ...}，與 match_ocr_to_front_back_by_permuted_ocr(threshold=0.0) 的各面結果相同；
+      top 不為空時只保證涵蓋分數 ≥ CANDIDATE_FLOOR 的刻字
+    - passed: top[0] 是否達 threshold
+    耗時：TESTData（407 列）上與兩次呼叫相當（約 1 ms / 查詢，見 benchmarks/bench_matcher.py），
+    省下的是 catalog 大、常走低信心 fallback 時的第二次掃描（合成 5 萬列約 215 → 70 ms）
+    片段排列超過 MATCH_MAX_ORDERINGS 時，beam search 只看第一批（分數可能 ≥ CANDIDATE_FLOOR）的候選，
+    best 可能與 threshold=0.0 重掃（beam 看全部候選）不同
+    """
+    hit = keyword_rule_hit(ocr_texts, df, index, positions)
+    if hit is not None:
+        special = _keyword_result(df, hit)
+        return {"top": [dict(special, side="front")], "best": {"front": special}, "passed": True}
+
+    state = _single_pass(ocr_texts, df, index, positions, max_orderings, top_n, CANDIDATE_FLOOR, fallback=True)
+    top = state.top(df)
+    best = {side: state.best_side(df, side) for side in ("front", "back")}
+    return {"top": top, "best": best, "passed": bool(top) and top[0]["score"] >= threshold}
+
+
+def match_ocr_to_front_back_by_permuted_ocr(ocr_texts, df, threshold=0.8, index=None, max_orderings=None,
+                                            positions=None):
+    """
+    index: build_imprint_index 建好的刻字索引（可省略，省略時就地建立）
+    max_orderings: 最多評估的片段排列數（預設 MATCH_MAX_ORDERINGS）
+    positions: 只比對 df 的這些列位置（顏色 / 外型篩選結果；省略時比對整個 df）
+    """
+    # === 關鍵字規則（藥袋文字 / 商品名）：命中時直接回傳 ===
+    hit = keyword_rule_hit(ocr_texts, df, index, positions)
+    if hit is not None:
+        return {"front": _keyword_result(df, hit)}
 
     # === 正常流程：排列 OCR 結果再逐一比對 ===
-    permutations = itertools.permutations(ocr_texts)
-    for perm in permutations:
-        combined_ocr = ''.join(perm).upper()
-
-        for _, row in df.iterrows():
-            text_field = str(row.get("文字", "")).strip()
-            parts = text_field.split('|')
-
-            front_text = ""
-            back_text = ""
-
-            for p in parts:
-                if ':' in p:
-                    k, v = p.split(':', 1)
-                    key = k.strip().upper()
-                    val = v.strip().upper()
-                    if key == "F":
-                        front_text = val
-                    elif key == "B":
-                        back_text = val
-
-            # 比對 F
-            if front_text:
-                score_f = lcs_score(combined_ocr, front_text)
-                print(f"[DEBUG-F] 比對 {combined_ocr} ↔ {front_text} ➜ score = {score_f:.3f}")
-                if score_f > best_front["score"]:
-                    best_front.update({"score": score_f, "text": combined_ocr, "match": front_text, "row": row})
-
-            # 比對 B
-            if back_text:
-                score_b = lcs_score(combined_ocr, back_text)
-                print(f"[DEBUG-B] 比對 {combined_ocr} ↔ {back_text} ➜ score = {score_b:.3f}")
-                if score_b > best_back["score"]:
-                    best_back.update({"score": score_b, "text": combined_ocr, "match": back_text, "row": row})
+    # 分數 0 的刻字永遠不會取代初始的最佳值；門檻 ≥ CANDIDATE_FLOOR 時，低於 CANDIDATE_FLOOR 的也不會被回傳
+    state = _single_pass(ocr_texts, df, index, positions, max_orderings, 0, min(threshold, CANDIDATE_FLOOR))
+    best_front = state.best_side(df, "front")
+    best_back = state.best_side(df, "back")
 
     # === 判斷是否達門檻 ===
     result = {}
     if best_front["score"] >= threshold:
-        # print("最佳正面比對結果：", best_front["match"], f"(score={best_front['score']:.3f})")
         result["front"] = best_front
     if best_back["score"] >= threshold:
-        # print("最佳背面比對結果：", best_back["match"], f"(score={best_back['score']:.3f})")
         result["back"] = best_back
 
     # === 不達門檻時，取分數最高的結果 ===
     if not result:
-        if best_front["score"] >= 0.5:
-            # print("⚠沒有達門檻，但採用最接近的 FRONT 結果")
+        if best_front["score"] >= CANDIDATE_FLOOR:
             result["front"] = best_front
-        elif best_back["score"] >= 0.5:
-            # print("⚠沒有達門檻，但採用最接近的 BACK 結果")
+        elif best_back["score"] >= CANDIDATE_FLOOR:
             result["back"] = best_back
 
     return result if result else None
 
-def match_top_n_ocr_to_front_back(ocr_texts, df, threshold=0.8, top_n=3):
-    results = []
-
-    combined_all = ''.join(ocr_texts).upper()
-    keywords = {"ACETYLCYSTEINE", "ACTEIN"}
-    if any(kw in combined_all for kw in keywords):
-        matched_rows = df[df["文字"].str.contains("ACETYLCYSTEINE|ACTEIN", case=False, na=False)]
-        if not matched_rows.empty:
-            match_row = matched_rows.iloc[0]
-            return [{
-                "score": 1.0,
-                "text": "藥袋特例",
-                "match": "ACETYLCYSTEINE / ACTEIN",
-                "row": match_row,
-                "side": "front"
-            }]
-
-    permutations = itertools.permutations(ocr_texts)
-    for perm in permutations:
-        combined_ocr = ''.join(perm).upper()
-
-        for _, row in df.iterrows():
-            text_field = str(row.get("文字", "")).strip()
-            parts = text_field.split('|')
-
-            front_text, back_text = "", ""
-
-            for p in parts:
-                if ':' in p:
-                    k, v = p.split(':', 1)
-                    key = k.strip().upper()
-                    val = v.strip().upper()
-                    if key == "F":
-                        front_text = val
-                    elif key == "B":
-                        back_text = val
-
-            # 比對 F
-            if front_text:
-                score_f = lcs_score(combined_ocr, front_text)
-                if score_f >= 0.5:
-                    results.append({
-                        "score": score_f,
-                        "text": combined_ocr,
-                        "match": front_text,
-                        "row": row,
-                        "side": "front"
-                    })
-                print(f"[DEBUG-F] 比對 {combined_ocr} ↔ {front_text} ➜ score = {score_f:.3f}")
-            # 比對 B
-            if back_text:
-                score_b = lcs_score(combined_ocr, back_text)
-                print(f"[DEBUG-B] 比對 {combined_ocr} ↔ {back_text} ➜ score = {score_b:.3f}")
-                if score_b >= 0.5:
-                    results.append({
-                        "score": score_b,
-                        "text": combined_ocr,
-                        "match": back_text,
-                        "row": row,
-                        "side": "back"
-                    })
-
-    # 優先保留高於 threshold 的，再補滿 top_n
-    filtered = [r for r in results if r["score"] >= threshold]
-    if len(filtered) >= top_n:
-        return sorted(filtered, key=lambda r: -r["score"])[:top_n]
-    else:
-        return sorted(results, key=lambda r: -r["score"])[:top_n]
+
+def match_top_n_ocr_to_front_back(ocr_texts, df, threshold=0.8, top_n=3, index=None, max_orderings=None,
+                                  positions=None):
+    """
+    index: build_imprint_index 建好的刻字索引（可省略，省略時就地建立）
+    max_orderings: 最多評估的片段排列數（預設 MATCH_MAX_ORDERINGS）
+    positions: 只比對 df 的這些列位置（顏色 / 外型篩選結果；省略時比對整個 df）
+    分數 ≥ CANDIDATE_FLOOR 的結果依分數取前 top_n 筆（達 threshold 的自然排在前面）
+    """
+    hit = keyword_rule_hit(ocr_texts, df, index, positions)
+    if hit is not None:
+        return [dict(_keyword_result(df, hit), side="front")]
+
+    # 只有分數可能 ≥ CANDIDATE_FLOOR 的刻字需要算 LCS
+    return _single_pass(ocr_texts, df, index, positions, max_orderings, top_n, CANDIDATE_FLOOR).top(df)
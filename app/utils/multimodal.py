@@ -0,0 +1,148 @@
+# multimodal.py — /match 的融合排序（MATCH_RANKING=fused 時使用）
+#
+# 每個 catalog 列算一個融合分數，全部以 NumPy 向量一次算完：
+#   score = (w_text × 文字相似度 + w_color × 顏色重疊 + w_shape × 外型一致) / (w_text + w_color + w_shape)
+# - 文字相似度：OCR 各種片段排列 × 正 / 背面刻字的最高 LCS 分數（bit-parallel，與 lcs_score 相同）
+# - 顏色重疊：|列的顏色 ∩ 查詢顏色| / min(|列的顏色|, |查詢顏色|)（overlap coefficient，一方包含另一方時為 1）
+# - 外型一致：列的外型 = 查詢外型時為 1；沒有指定外型時全部為 1
+# 顏色 / 外型不再是「不符就剔除」的硬篩選，而是降低排名；前 top_n 以 argpartition 取出
+# 所有分數陣列都以列位置當索引：df、刻字索引（ImprintIndex）、顏色 / 外型遮罩必須是同一份完整 catalog
+# （app.df / app.imprint_index / app.color_shape_masks），不能傳篩選後的 df_sub
+
+import os
+
+import numpy as np
+
+from app.utils.matcher import (candidate_positions, fragment_orderings, keyword_rule_hit, row_at, scope_positions,
+                                side_candidates)
+
+MATCH_WEIGHT_TEXT = float(os.getenv("MATCH_WEIGHT_TEXT", "0.7"))
+MATCH_WEIGHT_COLOR = float(os.getenv("MATCH_WEIGHT_COLOR", "0.2"))
+MATCH_WEIGHT_SHAPE = float(os.getenv("MATCH_WEIGHT_SHAPE", "0.1"))
+
+
+def _catalog_index(df, index, masks=None):
+    """
+    確認 df、刻字索引（與遮罩）的列位置一一對齊，回傳可用的索引（省略時就地建立）
+    對不上（例如傳入篩選後的 df_sub）時丟 ValueError
+    """
+    index, scope = scope_positions(df, index)
+    if len(index) != len(df) or not np.array_equal(scope, np.arange(len(df))):
+        raise ValueError("融合排序需要完整 catalog：df 與刻字索引的列必須一一對齊")
+    if masks is not None and masks.n_rows != len(df):
+        raise ValueError(f"顏色 / 外型遮罩列數（{masks.n_rows}）與 df（{len(df)}）不符")
+    return index
+
+
+def text_scores(ocr_texts, df, index, max_orderings=None):
+    """
+    每列的文字相似度與其來源：(scores, side, ordering, orderings)；df 必須是與 index 對齊的完整 catalog
+    - scores[i]: 所有排列 × 正 / 背面中最高的 LCS 分數（沒有刻字或沒有共同字元為 0）
+    - side[i]: 0 = 正面、1 = 背面；ordering[i]: 取得最高分的排列序號（同分取先比對到的）
+    """
+    index = _catalog_index(df, index)
+    n = len(df)
+    scores = np.zeros(n, dtype=np.float64)
+    side = np.zeros(n, dtype=np.int8)
+    ordering = np.zeros(n, dtype=np.int64)
+    index, positions = candidate_positions(df, index)
+    # 分數 0 的列不影響結果，只算和 OCR 有共同字元的刻字
+    cand_f, cand_b = side_candidates(index, positions, ocr_texts, 0.0)
+    orderings = fragment_orderings(ocr_texts, index, (cand_f, cand_b), max_orderings)
+
+    engines = ((0, cand_f, index.front_lcs.restrict(cand_f)), (1, cand_b, index.back_lcs.restrict(cand_b)))
+    for o, combined_ocr in enumerate(orderings):
+        for s, cand, lcs in engines:
+            if len(cand) == 0:
+                continue
+            sc = lcs.scores(combined_ocr)
+            better = sc > scores[cand]
+            idx = cand[better]
+            scores[idx] = sc[better]
+            side[idx] = s
+            ordering[idx] = o
+    return scores, side, ordering, orderings
+
+
+def color_scores(masks, colors):
+    """每列的顏色重疊（overlap coefficient）；沒有指定顏色時全部為 0"""
+    colors = [c for c in dict.fromkeys(colors)]
+    if not colors:
+        return np.zeros(masks.n_rows, dtype=np.float64)
+    all_colors = np.array(list(masks.color.values()), dtype=bool).reshape(-1, masks.n_rows)
+    row_count = all_colors.sum(axis=0)
+    hits = np.array([masks.color_mask(c) for c in colors], dtype=bool).sum(axis=0)
+    denom = np.minimum(row_count, len(colors))
+    out = np.zeros(masks.n_rows, dtype=np.float64)
+    np.divide(hits, denom, out=out, where=denom > 0)
+    return out
+
+
+def shape_scores(masks, shape):
+    """每列的外型一致（0 / 1）；沒有指定外型時全部為 1"""
+    if not shape:
+        return np.ones(masks.n_rows, dtype=np.float64)
+    return masks.shape_mask(shape).astype(np.float64)
+
+
+def row_colors(row):
+    """「紅色|白色」→ ["紅色", "白色"]"""
+    return [c.strip() for c in str(row.get("顏色", "")).split("|") if c.strip()]
+
+
+def fused_top_n(ocr_texts, colors, shape, df, masks, index=None, top_n=4, weights=None, max_orderings=None):
+    """
+    回傳融合分數最高的 top_n 筆（由高到低；同分時列位置小的在前），每筆：
+    {"score", "text_score", "color_score", "shape_score", "text", "match", "side", "row", "matched_colors"}
+    - df / masks / index: 同一份完整 catalog（列位置一一對齊，對不上時丟 ValueError）
+    - colors: 已展開的查詢顏色（expand_colors 之後）
+    - weights: (文字, 顏色, 外型)，預設 MATCH_WEIGHT_TEXT / COLOR / SHAPE
+    """
+    w_text, w_color, w_shape = weights or (MATCH_WEIGHT_TEXT, MATCH_WEIGHT_COLOR, MATCH_WEIGHT_SHAPE)
+    total = w_text + w_color + w_shape
+    if total <= 0 or top_n <= 0 or len(df) == 0:
+        return []
+    index = _catalog_index(df, index, masks)
+
+    text, side, ordering, orderings = text_scores(ocr_texts, df, index, max_orderings)
+    # 關鍵字規則命中的列文字分數直接視為 1.0
+    special, rule = None, None
+    hit = keyword_rule_hit(ocr_texts, df, index)
+    if hit is not None:
+        _, rule, special = hit
+        text[special] = 1.0
+    color = color_scores(masks, colors)
+    shape_score = shape_scores(masks, shape)
+    fused = (w_text * text + w_color * color + w_shape * shape_score) / total
+
+    k = min(top_n, len(fused))
+    top = np.argpartition(-fused, k - 1)[:k]
+    # 第 k 名同分的列可能不只一筆：argpartition 挑哪些不固定，改取列位置最小的
+    kth = fused[top].min()
+    above = np.flatnonzero(fused > kth)
+    top = np.concatenate([above, np.flatnonzero(fused == kth)[:k - len(above)]])
+    top = top[np.lexsort((top, -fused[top]))]
+
+    results = []
+    for p in top.tolist():
+        row = row_at(df, index, p)
+        if p == special:
+            text_str, match, side_name = rule["text"], rule["match"], "front"
+        elif text[p] > 0:
+            side_name = "front" if side[p] == 0 else "back"
+            text_str = orderings[ordering[p]]
+            match = (index.front if side[p] == 0 else index.back)[p]
+        else:
+            text_str, match, side_name = "", None, None
+        results.append({
+            "score": float(fused[p]),
+            "text_score": float(text[p]),
+            "color_score": float(color[p]),
+            "shape_score": float(shape_score[p]),
+            "text": text_str,
+            "match": match,
+            "side": side_name,
+            "row": row,
+            "matched_colors": [c for c in row_colors(row) if c in colors],
+        })
+    return results
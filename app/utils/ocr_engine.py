@@ -0,0 +1,177 @@
+# ocr_engine.py — OpenOCR 引擎建立（ONNX Runtime session 設定 + 多 session 池）
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+import onnxruntime as ort
+from openocr import OpenOCR
+
+# ====== ONNX Runtime session 設定（皆可用環境變數覆寫）======
+# 執行緒數 0 = 交給 ONNX Runtime 自行決定（預設為實體核心數）
+OCR_INTRA_OP_THREADS = int(os.getenv("OCR_INTRA_OP_THREADS", "0"))
+OCR_INTER_OP_THREADS = int(os.getenv("OCR_INTER_OP_THREADS", "0"))
+# disable / basic / extended / all
+OCR_GRAPH_OPT_LEVEL = os.getenv("OCR_GRAPH_OPT_LEVEL", "all")
+OCR_ENABLE_MEM_ARENA = os.getenv("OCR_ENABLE_MEM_ARENA", "1") == "1"
+# sequential / parallel（parallel 才會用到 inter-op 執行緒）
+OCR_EXECUTION_MODE = os.getenv("OCR_EXECUTION_MODE", "sequential")
+# session 池大小：同時可跑 OCR 的請求數（gunicorn threads 數量建議一致）
+OCR_POOL_SIZE = max(1, int(os.getenv("OCR_POOL_SIZE", "1")))
+
+# setup_models.py 下載的位置；不存在時交給 OpenOCR 下載到 ~/.cache/openocr
+OCR_DET_MODEL_PATH = os.getenv("OCR_DET_MODEL_PATH", "models/openocr_det_model.onnx")
+OCR_REC_MODEL_PATH = os.getenv("OCR_REC_MODEL_PATH", "models/openocr_rec_model.onnx")
+# INT8 量化模型（由 quantize_models.py build 產生）；OCR_INT8=1 時取代 FP32 模型
+OCR_INT8 = os.getenv("OCR_INT8", "0") == "1"
+OCR_DET_INT8_MODEL_PATH = os.getenv("OCR_DET_INT8_MODEL_PATH", "models/openocr_det_model.int8.onnx")
+OCR_REC_INT8_MODEL_PATH = os.getenv("OCR_REC_INT8_MODEL_PATH", "models/openocr_rec_model.int8.onnx")
+
+GRAPH_OPT_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def ocr_session_config():
+    """目前生效的 OCR session 設定（給 /debug 顯示）"""
+    det_path, rec_path = model_paths()
+    return {
+        "intra_op_threads": OCR_INTRA_OP_THREADS,
+        "inter_op_threads": OCR_INTER_OP_THREADS,
+        "graph_opt_level": OCR_GRAPH_OPT_LEVEL,
+        "mem_arena": OCR_ENABLE_MEM_ARENA,
+        "execution_mode": OCR_EXECUTION_MODE,
+        "pool_size": OCR_POOL_SIZE,
+        "int8": OCR_INT8,
+        "det_model": det_path,
+        "rec_model": rec_path,
+    }
+
+
+def build_session_options():
+    if OCR_GRAPH_OPT_LEVEL not in GRAPH_OPT_LEVELS:
+        raise ValueError(f"OCR_GRAPH_OPT_LEVEL must be one of {list(GRAPH_OPT_LEVELS)}")
+    if OCR_EXECUTION_MODE not in EXECUTION_MODES:
+        raise ValueError(f"OCR_EXECUTION_MODE must be one of {list(EXECUTION_MODES)}")
+
+    so = ort.SessionOptions()
+    if OCR_INTRA_OP_THREADS > 0:
+        so.intra_op_num_threads = OCR_INTRA_OP_THREADS
+    if OCR_INTER_OP_THREADS > 0:
+        so.inter_op_num_threads = OCR_INTER_OP_THREADS
+    so.graph_optimization_level = GRAPH_OPT_LEVELS[OCR_GRAPH_OPT_LEVEL]
+    so.enable_cpu_mem_arena = OCR_ENABLE_MEM_ARENA
+    so.execution_mode = EXECUTION_MODES[OCR_EXECUTION_MODE]
+    return so
+
+
+def _existing(path):
+    return path if path and os.path.exists(path) else None
+
+
+def model_paths():
+    """回傳 (偵測模型, 辨識模型) 路徑；OCR_INT8 開啟但量化檔不存在時退回 FP32"""
+    if OCR_INT8:
+        if _existing(OCR_DET_INT8_MODEL_PATH) and _existing(OCR_REC_INT8_MODEL_PATH):
+            return OCR_DET_INT8_MODEL_PATH, OCR_REC_INT8_MODEL_PATH
+        print("[OCR] ⚠️ 找不到 INT8 模型（請先執行 python quantize_models.py build），改用 FP32")
+    return OCR_DET_MODEL_PATH, OCR_REC_MODEL_PATH
+
+
+class _TunedOrt:
+    """onnxruntime 的替身：InferenceSession 預設帶入自訂 SessionOptions，其餘屬性照舊"""
+
+    def __init__(self, so):
+        self._so = so
+
+    def InferenceSession(self, path_or_bytes, **kwargs):
+        kwargs.setdefault("sess_options", self._so)
+        return ort.InferenceSession(path_or_bytes, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(ort, name)
+
+
+_session_lock = threading.Lock()
+
+
+@contextmanager
+def _tuned_sessions(so):
+    """OpenOCR 建立 ONNXEngine 的期間，session 直接以 so 建立（每個模型只載入一次，不必建好再換掉）"""
+    from tools.infer import onnx_engine  # OpenOCR 匯入時已把自己的目錄加進 sys.path
+    with _session_lock:
+        onnx_engine.onnxruntime = _TunedOrt(so)
+        try:
+            yield
+        finally:
+            onnx_engine.onnxruntime = ort
+
+
+def create_ocr_engine():
+    """建立一個 OpenOCR 引擎（onnx, cpu），偵測/辨識 session 套用上面的設定"""
+    det_path, rec_path = (_existing(p) for p in model_paths())
+    with _tuned_sessions(build_session_options()):
+        return OpenOCR(
+            backend="onnx",
+            device="cpu",
+            onnx_det_model_path=det_path,
+            onnx_rec_model_path=rec_path,
+        )
+
+
+_pool = None
+_pool_engines = []
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                print(f"[OCR] loading OpenOCR (onnx, cpu) × {OCR_POOL_SIZE}…")
+                pool = queue.Queue()
+                for _ in range(OCR_POOL_SIZE):
+                    engine = create_ocr_engine()
+                    _pool_engines.append(engine)
+                    pool.put(engine)
+                _pool = pool
+    return _pool
+
+
+def reset_ocr_engines():
+    """清空 session 池；切換模型（例如 FP32 ↔ INT8）後，下次取用時重新建立"""
+    global _pool
+    with _pool_lock:
+        _pool = None
+        _pool_engines.clear()
+
+
+def get_ocr_engine():
+    """回傳池中的第一個引擎（預熱 / 單執行緒批次測試用；並行請求請改用 borrow_ocr_engine）"""
+    _get_pool()
+    return _pool_engines[0]
+
+
+@contextmanager
+def borrow_ocr_engine(timeout=None):
+    """
+    從 session 池借出一個引擎，用完自動歸還：
+        with borrow_ocr_engine() as engine:
+            get_best_ocr_texts(..., ocr_engine=engine)
+    池內引擎都在使用中時會等待（timeout 秒後丟 queue.Empty）
+    """
+    pool = _get_pool()
+    engine = pool.get(timeout=timeout)
+    try:
+        yield engine
+    finally:
+        pool.put(engine)
@@ -3,14 +3,34 @@ import json
 import re
 import os
 
+import numpy as np
+
+
+def _parse_ocr_records(records, name="default", min_score=0.8):
+    """
+    將 OpenOCR 的辨識結果（list[dict]，含 transcription / score / points）
+    轉成 (texts, avg_score)
+    """
+    valid = [r for r in records if r.get("score", 0) >= min_score]
+    texts = [
+        re.sub(r'[^A-Z0-9\\-]', '', r["transcription"].strip().upper())
+        for r in valid if r["transcription"].strip()
+    ]
+    avg_score = sum(r["score"] for r in valid) / len(valid) if valid else 0.0
+    # print(f"[{name}] 📝 OCR 結果：{texts} (Avg Score: {avg_score:.2f})")
+    return texts, avg_score
+
 
 def recognize_with_openocr(img, name="default", min_score=0.8, ocr_engine=None):
     """
-    使用 OpenOCR 執行辨識
+    使用 OpenOCR 執行辨識（舊版：先寫暫存 JPEG 再交給 OpenOCR 讀檔）
     - img: OpenCV 影像
     - name: 儲存暫存圖用的名稱
     - min_score: 過濾最低信心分數
     - ocr_engine: 必須傳入已初始化的 OpenOCR 引擎
+
+    ⚠️ 多個請求同時執行時，同名暫存檔會互相覆蓋；線上流程請改用
+    recognize_with_openocr_array（保留此函式供 benchmark 對照）
     """
     if ocr_engine is None:
         raise ValueError("ocr_engine is required")
@@ -28,14 +48,148 @@ def recognize_with_openocr(img, name="default", min_score=0.8, ocr_engine=None):
 
     try:
         result_json = json.loads(result[0].split('\t')[1])
-        valid = [r for r in result_json if r.get("score", 0) >= min_score]
-        texts = [
-            re.sub(r'[^A-Z0-9\\-]', '', r["transcription"].strip().upper())
-            for r in valid if r["transcription"].strip()
-        ]
-        avg_score = sum(r["score"] for r in valid) / len(valid) if valid else 0.0
-        # print(f"[{name}] 📝 OCR 結果：{texts} (Avg Score: {avg_score:.2f})")
-        return texts, avg_score
+        return _parse_ocr_records(result_json, name=name, min_score=min_score)
     except Exception as e:
         print(f"[{name}] ⚠️ JSON 解析失敗：{e}")
         return [], 0.0
+
+
+def recognize_with_openocr_array(img, name="default", min_score=0.8, ocr_engine=None):
+    """
+    使用 OpenOCR 執行辨識（記憶體版：ndarray 直接送進偵測/辨識模型，不寫暫存檔）
+    - img: OpenCV 影像（BGR ndarray）
+    - name: 僅供 log 使用
+    - min_score: 過濾最低信心分數
+    - ocr_engine: 必須傳入已初始化的 OpenOCR 引擎
+    """
+    if ocr_engine is None:
+        raise ValueError("ocr_engine is required")
+
+    try:
+        # img_numpy 模式回傳 list[list[dict]]，不會 JSON 序列化、也不會寫 e2e_results
+        result, _ = ocr_engine(img_numpy=img)
+        if not result or not result[0]:
+            return [], 0.0
+        return _parse_ocr_records(result[0], name=name, min_score=min_score)
+    except Exception as e:
+        print(f"[{name}] ⚠️ OCR 推論失敗：{e}")
+        return [], 0.0
+
+
+def _detect_boxes_batch(ocr_engine, imgs):
+    """
+    偵測多張影像的文字框；同尺寸影像（例如同一張裁切圖的各旋轉版本）
+    疊成一個 batch，只呼叫一次 ONNX 偵測模型
+    - return: 每張影像的 boxes（np.ndarray [K,4,2] 或 None）
+    """
+    det = ocr_engine.text_detector
+    if getattr(det, "backend", None) == "onnx":
+        try:
+            batches = [det.transform({"image": img}, det.ops[1:]) for img in imgs]
+            if len({b[0].shape for b in batches}) == 1:
+                images = np.stack([b[0] for b in batches])
+                shape_list = np.stack([b[1] for b in batches])
+                maps = det._inference_onnx(images)[0]
+                post = det.post_process_class({"maps": maps}, [None, shape_list], torch_tensor=False)
+                return [p["points"] for p in post]
+        except Exception as e:
+            # 模型不支援動態 batch 時退回逐張偵測
+            print(f"[OCR] ⚠️ 批次偵測失敗，改為逐張：{e}")
+    return [det(img_numpy=img)[0]["boxes"] for img in imgs]
+
+
+def recognize_batch_with_openocr(imgs, names=None, min_score=0.8, ocr_engine=None):
+    """
+    批次版 OpenOCR 辨識（例如同一張裁切圖的 8 個旋轉角度）：
+    偵測一次呼叫處理全部影像，所有文字框再合併成一個 padded batch 給辨識模型
+    - imgs: OpenCV 影像列表
+    - names: 僅供 log 使用
+    - return: list[(texts, avg_score)]，順序與 imgs 相同
+    """
+    if ocr_engine is None:
+        raise ValueError("ocr_engine is required")
+    names = names or [f"batch_{i}" for i in range(len(imgs))]
+
+    try:
+        from tools.infer_e2e import sorted_boxes
+        from tools.infer.utility import get_rotate_crop_image
+
+        boxes_per_img = _detect_boxes_batch(ocr_engine, imgs)
+
+        # 所有影像的文字框裁切圖攤平，記下各自屬於哪一張
+        crops, owners = [], []
+        for idx, (img, boxes) in enumerate(zip(imgs, boxes_per_img)):
+            if boxes is None or len(boxes) == 0:
+                continue
+            for box in sorted_boxes(np.asarray(boxes)):
+                crops.append(get_rotate_crop_image(img, np.array(box, dtype=np.float32)))
+                owners.append(idx)
+
+        records = [[] for _ in imgs]
+        if crops:
+            rec_res = ocr_engine.text_recognizer(img_numpy_list=crops, batch_num=len(crops))
+            for idx, r in zip(owners, rec_res):
+                if r["score"] >= ocr_engine.drop_score:
+                    records[idx].append({"transcription": r["text"], "score": r["score"]})
+
+        return [
+            _parse_ocr_records(recs, name=name, min_score=min_score)
+            for recs, name in zip(records, names)
+        ]
+    except Exception as e:
+        print(f"[OCR] ⚠️ 批次辨識失敗，改為逐張：{e}")
+        return [
+            recognize_with_openocr_array(img, name=name, min_score=min_score, ocr_engine=ocr_engine)
+            for img, name in zip(imgs, names)
+        ]
+
+
+def recognize_detect_once_with_openocr(img, angles=(0, 180), name="default",
+                                       min_score=0.8, ocr_engine=None, batched=True):
+    """
+    只在未旋轉的裁切圖上做一次文字偵測，再把偵測到的小文字框（points）
+    校正後轉成各候選方向給辨識模型
+    - img: OpenCV 影像
+    - angles: 文字框候選方向（僅支援 90 的倍數，逆時針，與 rotate_image_by_angle 一致）；
+      get_rotate_crop_image 已把每個框校正成水平（直的框會轉成橫的），只剩正 / 倒兩種可能，
+      預設只試 0 / 180，90 / 270 會變成直條，辨識模型只學過橫排文字
+    - batched: True 時所有框一次送辨識（padded batch）；False 時逐框辨識，分數與逐張推論相同
+    - return: list[(texts, avg_score)]，順序與 angles 相同
+    """
+    if ocr_engine is None:
+        raise ValueError("ocr_engine is required")
+    if any(a % 90 for a in angles):
+        raise ValueError("angles must be multiples of 90")
+
+    try:
+        from tools.infer_e2e import sorted_boxes
+        from tools.infer.utility import get_rotate_crop_image
+
+        boxes = _detect_boxes_batch(ocr_engine, [img])[0]
+        if boxes is None or len(boxes) == 0:
+            return [([], 0.0) for _ in angles]
+
+        # 文字框已依自身方向校正成水平，剩下的只差 90/180/270 度
+        line_crops = [
+            get_rotate_crop_image(img, np.array(box, dtype=np.float32))
+            for box in sorted_boxes(np.asarray(boxes))
+        ]
+        crops = [
+            np.ascontiguousarray(np.rot90(crop, k=(angle // 90) % 4))
+            for angle in angles for crop in line_crops
+        ]
+        rec_res = ocr_engine.text_recognizer(img_numpy_list=crops, batch_num=len(crops) if batched else 1)
+
+        outputs = []
+        n = len(line_crops)
+        for i, angle in enumerate(angles):
+            recs = [
+                {"transcription": r["text"], "score": r["score"]}
+                for r in rec_res[i * n:(i + 1) * n]
+                if r["score"] >= ocr_engine.drop_score
+            ]
+            outputs.append(_parse_ocr_records(recs, name=f"{name}_框旋轉{angle}", min_score=min_score))
+        return outputs
+    except Exception as e:
+        print(f"[{name}] ⚠️ 單次偵測辨識失敗：{e}")
+        return [([], 0.0) for _ in angles]
@@ -44,14 +44,19 @@
 import os
 import base64
 import logging
+from collections import Counter
+
 import cv2
-import torch
 import numpy as np
-from ultralytics import YOLO
 
-from app.utils.image_io import read_image_safely
-from openocr import OpenOCR
-from app.utils.ocr_utils import recognize_with_openocr
+from app.utils.image_io import load_image, resize_to_max_side
+from app.utils.yolo_runtime import ExportedYOLO, NumpyBoxes, find_exported_model
+from app.utils.ocr_engine import get_ocr_engine, borrow_ocr_engine
+from app.utils.ocr_utils import (
+    recognize_with_openocr_array,
+    recognize_batch_with_openocr,
+    recognize_detect_once_with_openocr,
+)
 from app.utils.shape_color_utils import (
     rotate_image_by_angle,
     enhance_contrast,
@@ -62,44 +67,89 @@ from app.utils.shape_color_utils import (
     get_dominant_colors,
     increase_brightness,
 
-    detect_shape_from_image
+    detect_shape_from_image,
+    estimate_imprint_orientation,
 )
 
-# ====== 輕量化設定 ======
-# Render 的 CPU 只有 1 核，避免 PyTorch/NumPy 開太多執行緒
-torch.set_num_threads(int(os.getenv("TORCH_NUM_THREADS", "1")))
-
 logging.getLogger("openrec").setLevel(logging.ERROR)
 # ocr_engine = OpenOCR(backend='onnx', device='cpu')
 
-DEVICE = "cuda:0" if torch.cuda.is_available() else "cpu"
+# YOLO 後端：auto（有匯出檔就用 OpenVINO/ONNX，否則 .pt）/ openvino / onnx / pt
+YOLO_BACKEND = os.getenv("YOLO_BACKEND", "auto")
+# 只有 .pt 後端會用到 torch；載入時才決定
+DEVICE = "cpu"
+# YOLO 兩段門檻：只在最低門檻推論一次，高門檻有框就只用高門檻的框
+YOLO_CONF_HI = 0.25
+YOLO_CONF_LO = 0.10
+# 讀圖後先縮到工作解析度再偵測，選到的框再映射回裁切來源圖
+# 預設 640 + INTER_LINEAR 與 YOLO letterbox 自己縮圖的結果相同，偵測輸入不變
+# 裁切來源圖：0 = 原圖（不複製）；> 0 時解碼就直接縮小（JPEG draft / HEIC 內嵌縮圖），再縮到長邊 ≤ CROP_MAX_SIDE
+DET_WORK_MAX_SIDE = int(os.getenv("DET_WORK_MAX_SIDE", "640"))
+CROP_MAX_SIDE = int(os.getenv("CROP_MAX_SIDE", "0"))
+
+# 多角度 OCR 是否批次推論（所有旋轉版本一次偵測、所有文字框一次辨識）
+# 預設關閉：批次時較短的輸入會補零，CTC 分數與最佳角度可能跟逐張推論不同；開啟前先用 main_batch_test.py 比較
+OCR_BATCH_ANGLES = os.getenv("OCR_BATCH_ANGLES", "0") == "1"
+# OCR 模式：
+# - "sweep"：整張裁切圖旋轉 8 個角度，每個角度都重新偵測＋辨識（預設）
+# - "detect_once"：只偵測一次，文字框校正成水平後再試 0/180 度辨識
+#   （OCR_BATCH_ANGLES 決定文字框是否一次送辨識；OCR_CASCADE / OCR_ORIENTATION_ESTIMATE 在此模式下不適用）
+OCR_MODE = os.getenv("OCR_MODE", "sweep")
+DETECT_ONCE_ANGLES = (0, 180)
+
+# === 角度 cascade（提早結束）===
+# 依優先順序嘗試角度，只要某個角度的平均信心分數與文字長度過門檻就停止，不再跑完 8 個角度
+OCR_CASCADE = os.getenv("OCR_CASCADE", "0") == "1"
+OCR_CASCADE_MIN_SCORE = float(os.getenv("OCR_CASCADE_MIN_SCORE", "0.95"))
+OCR_CASCADE_MIN_LEN = int(os.getenv("OCR_CASCADE_MIN_LEN", "2"))
+# 啟發式順序：多數藥品在 0° / 180° 就能讀出
+CASCADE_PRIORITY = (0, 180, 90, 270, 45, 225, 135, 315)
+# 各角度被 cascade 採用的次數，用來動態調整優先順序（每個 worker 各自累積）
+_angle_wins = Counter()
+
+# === 刻字方向估計 ===
+# 開啟後先從裁切圖估計刻字方向，只送「估計角度 + 180° 翻轉」兩個版本做 OCR；估不出來才跑完整 8 角度
+OCR_ORIENTATION_ESTIMATE = os.getenv("OCR_ORIENTATION_ESTIMATE", "0") == "1"
+
+if OCR_MODE == "detect_once":
+    # detect_once 的文字框各自校正方向，只試 0/180：沒有角度可以提早結束或事先估計
+    for _flag, _on in (("OCR_CASCADE", OCR_CASCADE), ("OCR_ORIENTATION_ESTIMATE", OCR_ORIENTATION_ESTIMATE)):
+        if _on:
+            print(f"[OCR] ⚠️ OCR_MODE=detect_once 不支援 {_flag}，此設定會被忽略")
 
-_ocr_engine = None
+_det_model = None
 
 
-def get_ocr_engine():
-    global _ocr_engine
-    if _ocr_engine is None:
-        print("[OCR] loading OpenOCR (onnx, cpu)…")
-        _ocr_engine = OpenOCR(backend='onnx', device='cpu')
-    return _ocr_engine
+def _load_pt_model():
+    """Ultralytics + PyTorch 載入 models/best.pt（沒有匯出檔時的後備）"""
+    global DEVICE
+    import torch
+    from ultralytics import YOLO
 
+    # ====== 輕量化設定 ======
+    # Render 的 CPU 只有 1 核，避免 PyTorch/NumPy 開太多執行緒
+    torch.set_num_threads(int(os.getenv("TORCH_NUM_THREADS", "1")))
+    DEVICE = "cuda:0" if torch.cuda.is_available() else "cpu"
 
-_det_model = None
+    m = YOLO("models/best.pt")
+    try:
+        m.fuse()
+    except Exception:
+        pass
+    return m
 
 
 def get_det_model():
-    """Lazy-load YOLO 權重，只初始化一次"""
+    """Lazy-load YOLO 權重，只初始化一次（有 export_yolo.py 匯出的模型時優先使用，不載入 torch）"""
     global _det_model
     if _det_model is None:
-        print("[DET] loading YOLO model…")
-        m = YOLO("models/best.pt")
-
-        try:
-            m.fuse()
-        except Exception:
-            pass
-        _det_model = m
+        backend, path = (None, None) if YOLO_BACKEND == "pt" else find_exported_model(YOLO_BACKEND)
+        if backend:
+            print(f"[DET] loading exported YOLO model ({backend}): {path}…")
+            _det_model = ExportedYOLO(backend, path)
+        else:
+            print("[DET] loading YOLO model…")
+            _det_model = _load_pt_model()
         print("[DET] model ready")
     return _det_model
 
@@ -132,29 +182,110 @@ def generate_image_versions(base_img):
     ]
 
 
+def _cascade_order(angles):
+    """依「過去採用次數 → 啟發式順序」排序候選角度"""
+    def rank(angle):
+        base = CASCADE_PRIORITY.index(angle) if angle in CASCADE_PRIORITY else len(CASCADE_PRIORITY)
+        return -_angle_wins[angle], base
+
+    return sorted(angles, key=rank)
+
+
+def _clears_cascade_bar(texts, score):
+    return score >= OCR_CASCADE_MIN_SCORE and sum(len(t) for t in texts) >= OCR_CASCADE_MIN_LEN
+
+
+def _ocr_angles(img_v, angles, version_name, batched, ocr_engine):
+    """對同一張影像的多個角度做 OCR，回傳 list[(full_name, texts, score)]"""
+    names = [f"{version_name}_旋轉{angle}" for angle in angles]
+    rotated_list = [rotate_image_by_angle(img_v, angle) for angle in angles]
+    if batched:
+        outputs = recognize_batch_with_openocr(
+            rotated_list, names=names, ocr_engine=ocr_engine, min_score=0.8
+        )
+    else:
+        outputs = [
+            recognize_with_openocr_array(
+                rotated, ocr_engine=ocr_engine, name=full_name, min_score=0.8
+            )
+            for rotated, full_name in zip(rotated_list, names)
+        ]
+    return [(full_name, texts, score) for full_name, (texts, score) in zip(names, outputs)]
+
+
 def get_best_ocr_texts(
         image_versions,
         angles=(0, 45, 90, 135, 180, 225, 270, 315), ocr_engine=None,
         # angles=(0, 90, 180, 270), ocr_engine=None,
+        batched=None,
+        mode=None,
+        cascade=None,
+        stats=None,
 ):
+    """
+    多版本 × 多角度 OCR，取 len(text) * score 最高者
+    - cascade: 依優先順序分段嘗試角度，過門檻即提早結束（None → OCR_CASCADE）
+    - mode: "sweep" / "detect_once"（None → OCR_MODE）；detect_once 固定試 DETECT_ONCE_ANGLES，不使用 angles 與 cascade
+    - stats: 若傳入 dict，寫入本次請求實際評估的角度數（angles_evaluated）與是否提早結束（early_exit）
+    """
+    if batched is None:
+        batched = OCR_BATCH_ANGLES
+    if mode is None:
+        mode = OCR_MODE
+    if cascade is None:
+        cascade = OCR_CASCADE
     version_results = {}
     score_dict = {}
+    angle_of = {}
+    evaluated = 0
+    early_exit = False
 
     for img_v, version_name in image_versions:
-        for angle in angles:
-            rotated = rotate_image_by_angle(img_v, angle)
-            full_name = f"{version_name}_旋轉{angle}"
-            texts, score = recognize_with_openocr(
-                rotated, ocr_engine=ocr_engine, name=full_name, min_score=0.8
+        if mode == "detect_once":
+            outputs = recognize_detect_once_with_openocr(
+                img_v, angles=DETECT_ONCE_ANGLES, name=version_name, ocr_engine=ocr_engine, min_score=0.8,
+                batched=batched,
             )
-            version_results[full_name] = texts
-            score_dict[full_name] = score
+            for angle, (texts, score) in zip(DETECT_ONCE_ANGLES, outputs):
+                full_name = f"{version_name}_框旋轉{angle}"
+                version_results[full_name] = texts
+                score_dict[full_name] = score
+            evaluated += len(DETECT_ONCE_ANGLES)
+            continue
+
+        if cascade:
+            # 批次模式每段 2 個角度（例如 0°+180°）一起推論，否則逐一角度
+            order = _cascade_order(angles)
+            step = 2 if batched else 1
+        else:
+            order = list(angles)
+            step = len(order)
+
+        for i in range(0, len(order), step):
+            chunk = order[i:i + step]
+            for angle, (full_name, texts, score) in zip(
+                    chunk, _ocr_angles(img_v, chunk, version_name, batched, ocr_engine)):
+                version_results[full_name] = texts
+                score_dict[full_name] = score
+                angle_of[full_name] = angle
+            evaluated += len(chunk)
+            if cascade and any(_clears_cascade_bar(version_results[k], score_dict[k]) for k in version_results):
+                early_exit = True
+                break
+        if early_exit:
+            break
 
     score_combined = {
         k: (sum(len(txt) for txt in version_results[k]) * score_dict[k])
         for k in version_results
     }
     best_name = max(score_combined, key=score_combined.get)
+
+    if early_exit and best_name in angle_of:
+        _angle_wins[angle_of[best_name]] += 1
+    if stats is not None:
+        stats["angles_evaluated"] = evaluated
+        stats["early_exit"] = early_exit
     return version_results[best_name], best_name, score_dict[best_name]
 
 
@@ -232,10 +363,31 @@ def _fallback_rembg_crop(input_img):
         return None
 
 
+def _as_numpy(x):
+    """torch.Tensor（.pt 後端）或 np.ndarray（匯出模型後端）→ np.ndarray"""
+    return x.cpu().numpy() if hasattr(x, "cpu") else np.asarray(x)
+
+
+def _split_boxes_by_conf(boxes, min_conf):
+    """
+    把低門檻推論的 boxes 拆成 (高於 min_conf 的框, 全部框)
+    NMS 由高分往低分處理，高分框只會被更高分的框抑制，
+    因此「conf=0.10 推論後篩 > 0.25」與「直接 conf=0.25 推論」結果相同
+    """
+    if boxes is None:
+        empty = NumpyBoxes(np.zeros((0, 4), np.float32), np.zeros((0,), np.float32), np.zeros((0,), np.float32))
+        return empty, empty
+    xyxy = _as_numpy(boxes.xyxy).reshape(-1, 4)
+    conf = _as_numpy(boxes.conf).reshape(-1)
+    cls = _as_numpy(boxes.cls).reshape(-1)
+    keep = conf > min_conf
+    return NumpyBoxes(xyxy[keep], conf[keep], cls[keep]), NumpyBoxes(xyxy, conf, cls)
+
+
 def _pick_crop_from_boxes(input_img, boxes):
     """從 YOLO boxes 選最佳框並回傳裁切圖（不再去背）"""
-    xyxy = boxes.xyxy.cpu().numpy()  # [N,4]
-    conf = boxes.conf.squeeze().cpu().numpy()
+    xyxy = _as_numpy(boxes.xyxy)  # [N,4]
+    conf = _as_numpy(boxes.conf).squeeze()
     conf = conf if conf.ndim else conf[None]
 
     areas = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
@@ -254,29 +406,52 @@ def _pick_crop_from_boxes(input_img, boxes):
     return cropped
 
 
+def ingest_for_detection(image_bgr):
+    """
+    downscale-first 前處理：
+    - crop_src：裁切用影像（CROP_MAX_SIDE=0 時就是原圖本身）
+    - det_img：偵測用工作影像（長邊 ≤ DET_WORK_MAX_SIDE）
+    - return: (det_img, crop_src, (sx, sy))；(sx, sy) 為偵測座標 → 裁切座標的倍率
+    """
+    crop_src = resize_to_max_side(image_bgr, CROP_MAX_SIDE)
+    det_img = resize_to_max_side(crop_src, DET_WORK_MAX_SIDE, interpolation=cv2.INTER_LINEAR)
+    sy = crop_src.shape[0] / det_img.shape[0]
+    sx = crop_src.shape[1] / det_img.shape[1]
+    return det_img, crop_src, (sx, sy)
+
+
+def crop_pill(crop_src, boxes, det_to_crop):
+    """
+    把偵測座標的 boxes 映射回 crop_src 後選框裁切
+    - return: (cropped_bgr, cropped_rgb)；RGB 只轉裁切區域
+    """
+    sx, sy = det_to_crop
+    xyxy = _as_numpy(boxes.xyxy).reshape(-1, 4) * np.array([sx, sy, sx, sy], dtype=np.float32)
+    cropped_bgr = _pick_crop_from_boxes(crop_src, NumpyBoxes(xyxy, boxes.conf, boxes.cls))
+    cropped_rgb = cv2.cvtColor(cropped_bgr, cv2.COLOR_BGR2RGB)
+    return cropped_bgr, cropped_rgb
+
+
 import time  # 確保你有加上這行
 
 
-def process_image(img_path: str):
+def process_image(img_path):
     """
     單張藥品圖片辨識流程：
-    圖片路徑 → 讀取 → YOLO → 裁切 → 顏色/外型 → 多版本 OCR → 回傳
+    圖片 → 讀取 → YOLO → 裁切 → 顏色/外型 → 多版本 OCR → 回傳
+    - img_path: 圖片路徑、圖片檔的 bytes，或已解碼的 BGR ndarray（/upload 走記憶體路徑，不寫暫存檔）
     """
-    # print(f"[PROC] start process_image: {img_path}")
+    # print(f"[PROC] start process_image: {img_path if isinstance(img_path, (str, os.PathLike)) else type(img_path).__name__}")
     # t0 = time.perf_counter()
     debug_start = time.perf_counter()
 
     # === 讀圖（BGR）===
-    image_bgr = read_image_safely(img_path)  # ✅ BGR 格式，OpenCV/YOLO 用
+    image_bgr = load_image(img_path, max_side=CROP_MAX_SIDE)  # ✅ BGR 格式，OpenCV/YOLO 用
     if image_bgr is None:
         return {"error": "圖片讀取失敗"}
 
-    # === 分出 RGB 給顏色分析用 ===
-    image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)  # ✅ RGB 給顏色分析
-
-
-    # === 用 BGR 做 YOLO 偵測 ===
-    input_img = image_bgr.copy()
+    # === 先縮到工作解析度給 YOLO；RGB 之後只對裁切區域轉 ===
+    input_img, crop_src, det_to_crop = ingest_for_detection(image_bgr)
     # t1 = time.perf_counter()
     # print(f"⏱️ Pillow RGB → OpenCV BGR：{(t1 - t0)*1000:.1f} ms")
     # print(f"⏱️ 讀取圖片：{(t1 - t0)*1000:.1f} ms")
@@ -295,7 +470,7 @@ def process_image(img_path: str):
     res = det_model.predict(
         source=input_img,
         imgsz=640,
-        conf=0.25,
+        conf=YOLO_CONF_LO,
         iou=0.7,
         device=DEVICE,
         verbose=False
@@ -303,33 +478,21 @@ def process_image(img_path: str):
     # yolo_t1 = time.perf_counter()
     # print("✅ YOLO 結束預測")
 
-    # === 裁切時間（含 fallback）===
+    # === 裁切時間（兩段門檻在後處理判斷，不再重跑第二次推論）===
     # crop_t0 = time.perf_counter()
-    boxes = res.boxes
-    if boxes is not None and boxes.xyxy.shape[0] > 0:
-        cropped_bgr = _pick_crop_from_boxes(input_img, boxes)  # 給 OCR/encode
-        cropped_rgb = _pick_crop_from_boxes(image_rgb, boxes)  # 給顏色分析
+    boxes_hi, boxes_all = _split_boxes_by_conf(res.boxes, YOLO_CONF_HI)
+    if boxes_hi.xyxy.shape[0] > 0:
+        cropped_bgr, cropped_rgb = crop_pill(crop_src, boxes_hi, det_to_crop)  # BGR 給 OCR/encode，RGB 給顏色分析
         det_src = "yolo_conf_0.25"
         # print("YOLO 0.25")
+    elif boxes_all.xyxy.shape[0] > 0:
+        cropped_bgr, cropped_rgb = crop_pill(crop_src, boxes_all, det_to_crop)
+        det_src = "yolo_conf_0.10"
+        # print("YOLO 0.10")
     else:
-        res_lo = det_model.predict(
-            source=input_img,
-            imgsz=640,
-            conf=0.10,
-            iou=0.7,
-            device=DEVICE,
-            verbose=False
-        )[0]
-        boxes_lo = res_lo.boxes
-        if boxes_lo is not None and boxes_lo.xyxy.shape[0] > 0:
-            cropped_bgr = _pick_crop_from_boxes(input_img, boxes_lo)
-            cropped_rgb = _pick_crop_from_boxes(image_rgb, boxes_lo)
-            det_src = "yolo_conf_0.10"
-            # print("YOLO 0.10")
-        else:
-            # 🚫 不再使用 rembg，直接回傳失敗
-            # print("🔴 YOLO 失敗 (0.25 / 0.10)，無法擷取藥品")
-            return {"error": "藥品擷取失敗"}
+        # 🚫 不再使用 rembg，直接回傳失敗
+        # print("🔴 YOLO 失敗 (0.25 / 0.10)，無法擷取藥品")
+        return {"error": "藥品擷取失敗"}
     # crop_t1 = time.perf_counter()
 
     # t3 = crop_t1
@@ -345,9 +508,18 @@ def process_image(img_path: str):
     # === 多版本 OCR 辨識 ===
     # print("🔍 OCR 開始辨識")
     image_versions = generate_image_versions(cropped_bgr)
-    best_texts, best_name, best_score = get_best_ocr_texts(
-        image_versions, ocr_engine=get_ocr_engine()
-    )
+    ocr_kwargs = {}
+    orient_src = None
+    if OCR_ORIENTATION_ESTIMATE and OCR_MODE != "detect_once":
+        est_angle, orient_src = estimate_imprint_orientation(cropped_bgr)
+        if est_angle is not None:
+            a = int(round(est_angle)) % 360
+            ocr_kwargs["angles"] = (a, (a + 180) % 360)
+    ocr_stats = {}
+    with borrow_ocr_engine() as ocr_engine:
+        best_texts, best_name, best_score = get_best_ocr_texts(
+            image_versions, ocr_engine=ocr_engine, stats=ocr_stats, **ocr_kwargs
+        )
 
     # t5 = time.perf_counter()
     # print("✅ OCR 結束辨識")
@@ -412,5 +584,8 @@ def process_image(img_path: str):
         "cropped_image": cropped_b64,
         "debug": {
             "det_source": det_src,
+            "ocr_angles_evaluated": ocr_stats.get("angles_evaluated"),
+            "ocr_early_exit": ocr_stats.get("early_exit"),
+            "ocr_orientation_source": orient_src,
         }
     }
@@ -302,4 +302,97 @@ def detect_shape_from_image(cropped_img, original_img=None, expected_shape=None)
         return "錯誤", None
 
 
+# === 刻字方向估計（OCR 前先估角度，只送「估計角度 + 180° 翻轉」兩個版本）===
+ORIENT_MIN_TEXT_PIXELS = 40  # 文字筆畫像素少於此值 → 不採用文字訊號
+ORIENT_MIN_ELONGATION = 1.5  # 長短軸比至少要這麼長，方向才有意義
+
+
+def _long_axis_from_rect(points):
+    """以 minAreaRect 取點集長邊方向（度，影像座標）與長寬比；不依賴 OpenCV 版本的角度慣例"""
+    rect = cv2.minAreaRect(points)
+    box = cv2.boxPoints(rect)
+    e1, e2 = box[1] - box[0], box[2] - box[1]
+    n1, n2 = np.linalg.norm(e1), np.linalg.norm(e2)
+    if min(n1, n2) < 1e-6:
+        return None, 0.0
+    long_edge = e1 if n1 >= n2 else e2
+    angle = np.degrees(np.arctan2(long_edge[1], long_edge[0]))
+    return angle, max(n1, n2) / min(n1, n2)
+
+
+def _long_axis_from_moments(contour):
+    """以輪廓二階動差（等同 fitEllipse 長軸）取方向與長短軸比"""
+    m = cv2.moments(contour)
+    if m["m00"] == 0:
+        return None, 0.0
+    mu20, mu02, mu11 = m["mu20"] / m["m00"], m["mu02"] / m["m00"], m["mu11"] / m["m00"]
+    angle = 0.5 * np.degrees(np.arctan2(2 * mu11, mu20 - mu02))
+    common = np.sqrt(4 * mu11 ** 2 + (mu20 - mu02) ** 2)
+    l1, l2 = (mu20 + mu02 + common) / 2, (mu20 + mu02 - common) / 2
+    if l2 <= 1e-6:
+        return None, 0.0
+    return angle, float(np.sqrt(l1 / l2))
+
+
+def _pill_contour(cropped_img):
+    """找藥錠外輪廓：陰影校正 → Otsu → 反向 Otsu，取面積落在合理範圍（20%~90%）的最大輪廓"""
+    h, w = cropped_img.shape[:2]
+    area = h * w
+    gray = cv2.cvtColor(cropped_img, cv2.COLOR_BGR2GRAY)
+    _, otsu = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    for binary in (preprocess_with_shadow_correction(cropped_img), otsu, cv2.bitwise_not(otsu)):
+        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+        if not contours:
+            continue
+        c = max(contours, key=cv2.contourArea)
+        if 0.2 * area <= cv2.contourArea(c) <= 0.9 * area:
+            return c
+    return None
+
+
+def estimate_imprint_orientation(cropped_img):
+    """
+    估計藥面刻字方向，回傳 (angle, source)
+    - angle: 傳給 rotate_image_by_angle 後文字會轉成水平（0~180）；另一個候選為 angle + 180
+    - source: "text_edges"（文字筆畫 minAreaRect）/ "ellipse"（藥錠長軸）/ None（圓形且無明顯文字 → 無法估計）
+    """
+    try:
+        h, w = cropped_img.shape[:2]
+        main_contour = _pill_contour(cropped_img)
+        mask = np.zeros((h, w), np.uint8)
+        if main_contour is not None:
+            cv2.drawContours(mask, [main_contour], -1, 255, thickness=cv2.FILLED)
+        else:
+            # 找不到可靠輪廓 → YOLO 裁切框內接橢圓（裁切已貼齊藥錠）
+            cv2.ellipse(mask, (w // 2, h // 2), (int(w * 0.42), int(h * 0.42)), 0, 0, 360, 255, -1)
+        # 內縮避免把藥錠外框當成文字邊緣
+        k = max(3, int(min(h, w) * 0.06)) | 1
+        mask = cv2.erode(mask, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (k, k)))
+
+        # === 訊號 1：文字筆畫（刻字偏暗 → blackhat；印字偏亮 → tophat）===
+        gray = cv2.cvtColor(cropped_img, cv2.COLOR_BGR2GRAY)
+        sk = max(3, int(min(h, w) * 0.05)) | 1
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (sk, sk))
+        strokes = cv2.max(
+            cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, kernel),
+            cv2.morphologyEx(gray, cv2.MORPH_TOPHAT, kernel),
+        )
+        _, strokes = cv2.threshold(strokes, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        strokes = cv2.bitwise_and(strokes, mask)
+        pts = cv2.findNonZero(strokes)
+        if pts is not None and len(pts) >= ORIENT_MIN_TEXT_PIXELS:
+            angle, elongation = _long_axis_from_rect(pts)
+            if angle is not None and elongation >= ORIENT_MIN_ELONGATION:
+                return float(angle % 180), "text_edges"
+
+        # === 訊號 2：藥錠長軸（橢圓形藥錠的刻字通常沿長軸）===
+        if main_contour is not None and len(main_contour) >= 5:
+            angle, elongation = _long_axis_from_moments(main_contour)
+            if angle is not None and elongation > CIRCLE_HI:
+                return float(angle % 180), "ellipse"
+    except Exception as e:
+        print(f"❗ estimate_imprint_orientation 發生錯誤：{e}")
+    return None, None
+
+
 ratios_list = []
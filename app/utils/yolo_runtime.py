@@ -0,0 +1,142 @@
+# yolo_runtime.py — 匯出後的 YOLO 偵測模型（ONNX Runtime / OpenVINO），請求路徑不需 torch
+#
+# 前處理 / 後處理與 Ultralytics 對匯出模型的 predict 相同：
+# LetterBox(640, auto=False, 灰邊 114) → RGB → /255 → NCHW，輸出 (1, 4+nc, N) → conf 過濾 → 分類別 NMS → 還原座標
+# 回傳物件提供 boxes.xyxy / boxes.conf / boxes.cls，與 _pick_crop_from_boxes 使用的介面一致
+
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+YOLO_ONNX_PATH = Path(os.getenv("YOLO_ONNX_PATH", "models/best.onnx"))
+YOLO_OPENVINO_DIR = Path(os.getenv("YOLO_OPENVINO_DIR", "models/best_openvino_model"))
+
+MAX_DET = 300
+MAX_WH = 7680  # 分類別 NMS 的座標位移量（同 Ultralytics）
+
+
+class NumpyBoxes:
+    """numpy 版 boxes；屬性名稱與 ultralytics.engine.results.Boxes 相同"""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy  # [N,4] 原圖座標
+        self.conf = conf  # [N]
+        self.cls = cls  # [N]
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+def letterbox(img, new_shape=640, color=(114, 114, 114)):
+    """縮放並補邊成 new_shape × new_shape；回傳 (影像, 縮放比例, (pad_w, pad_h))"""
+    h, w = img.shape[:2]
+    r = min(new_shape / h, new_shape / w)
+    new_unpad = (int(round(w * r)), int(round(h * r)))
+    dw, dh = (new_shape - new_unpad[0]) / 2, (new_shape - new_unpad[1]) / 2
+    if (w, h) != new_unpad:
+        img = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return img, r, (left, top)
+
+
+def _nms(boxes, scores, iou_thres):
+    """貪婪 NMS，回傳保留的索引（依分數由高到低）"""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[order[1:]] - inter + 1e-7)
+        order = order[1:][iou <= iou_thres]
+    return np.array(keep, dtype=np.int64)
+
+
+def postprocess(pred, orig_shape, ratio, pad, conf=0.25, iou=0.7):
+    """
+    pred: (1, 4+nc, N) 的原始輸出（cx, cy, w, h + 各類別分數）
+    return: NumpyBoxes（原圖座標，依分數排序）
+    """
+    p = pred[0].T  # [N, 4+nc]
+    cls_scores = p[:, 4:]
+    cls_ids = cls_scores.argmax(axis=1)
+    scores = cls_scores[np.arange(len(p)), cls_ids]
+    mask = scores > conf
+    p, scores, cls_ids = p[mask], scores[mask], cls_ids[mask]
+    if len(p) == 0:
+        empty = np.zeros((0,), np.float32)
+        return NumpyBoxes(np.zeros((0, 4), np.float32), empty, empty)
+
+    cx, cy, bw, bh = p[:, 0], p[:, 1], p[:, 2], p[:, 3]
+    xyxy = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1)
+    keep = _nms(xyxy + cls_ids[:, None] * MAX_WH, scores, iou)[:MAX_DET]
+    xyxy, scores, cls_ids = xyxy[keep], scores[keep], cls_ids[keep]
+
+    # 還原到原圖座標
+    xyxy[:, [0, 2]] -= pad[0]
+    xyxy[:, [1, 3]] -= pad[1]
+    xyxy /= ratio
+    h, w = orig_shape
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+    return NumpyBoxes(xyxy.astype(np.float32), scores.astype(np.float32), cls_ids.astype(np.float32))
+
+
+class ExportedYOLO:
+    """
+    匯出模型的 predict 介面（參數與 ultralytics YOLO.predict 相同，device/verbose 僅為相容而保留）
+    """
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = str(path)
+        if backend == "openvino":
+            import openvino as ov
+            xml = next(Path(path).glob("*.xml"))
+            self._model = ov.Core().compile_model(str(xml), "CPU")
+            self._output = self._model.output(0)
+        else:
+            import onnxruntime as ort
+            self._session = ort.InferenceSession(self.path, providers=["CPUExecutionProvider"])
+            self._input_name = self._session.get_inputs()[0].name
+
+    def _infer(self, x):
+        if self.backend == "openvino":
+            return self._model(x)[self._output]
+        return self._session.run(None, {self._input_name: x})[0]
+
+    def predict(self, source, imgsz=640, conf=0.25, iou=0.7, device=None, verbose=False, **kwargs):
+        img, ratio, pad = letterbox(source, imgsz)
+        x = cv2.cvtColor(img, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[None]
+        x = np.ascontiguousarray(x, dtype=np.float32) / 255.0
+        pred = self._infer(x)
+        return [_Result(postprocess(pred, source.shape[:2], ratio, pad, conf=conf, iou=iou))]
+
+
+def find_exported_model(backend="auto"):
+    """
+    依 backend 找可用的匯出模型，回傳 (backend, path) 或 (None, None)
+    - auto：OpenVINO（已安裝且有匯出檔）→ ONNX → 無
+    """
+    if backend in ("auto", "openvino") and YOLO_OPENVINO_DIR.exists() and any(YOLO_OPENVINO_DIR.glob("*.xml")):
+        try:
+            import openvino  # noqa: F401
+            return "openvino", YOLO_OPENVINO_DIR
+        except ImportError:
+            if backend == "openvino":
+                print("[DET] ⚠️ 未安裝 openvino，改用其他後端")
+    if backend in ("auto", "onnx", "openvino") and YOLO_ONNX_PATH.exists():
+        return "onnx", YOLO_ONNX_PATH
+    return None, None
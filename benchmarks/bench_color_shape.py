@@ -0,0 +1,82 @@
+# benchmarks/bench_color_shape.py
+# /match 的顏色 / 外型篩選：改寫前（每個請求把 color_dict / shape_dict 轉成 set、聯集 / 交集、
+# df[df["用量排序"].isin(...)]）vs 預先建好的 ColorShapeMasks（位元運算 → 列位置）
+# 檢查所有「1~2 種顏色 × 外型（含不指定）」組合的篩選結果完全相同，
+# 以及把列位置直接交給 matcher 與傳 df_sub 的比對結果相同
+#
+# 用法（在專案根目錄）：
+#   python -m benchmarks.bench_color_shape
+import itertools
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.utils import matcher
+from app.utils.data_loader import VALID_COLORS, VALID_SHAPES, generate_color_shape_dicts
+from benchmarks.bench_matcher import _key, make_queries
+
+EXCEL_PATH = "data/TESTData.xlsx"
+REPEAT = 200
+
+
+def filter_baseline(df, color_dict, shape_dict, colors, shape):
+    """改寫前 /match 的篩選流程"""
+    color_sets = [set(color_dict.get(color, [])) for color in colors]
+    candidates = set.union(*color_sets) if color_sets else set()
+    if shape:
+        candidates &= set(shape_dict.get(shape, []))
+    if not candidates:
+        return None
+    return df[df["用量排序"].isin(candidates)]
+
+
+def main():
+    df = pd.read_excel(EXCEL_PATH)
+    color_dict, shape_dict, _, masks = generate_color_shape_dicts(df, with_masks=True)
+    index = matcher.build_imprint_index(df)
+
+    combos = [(list(c), s) for n in (1, 2) for c in itertools.combinations(VALID_COLORS, n)
+              for s in [""] + VALID_SHAPES]
+    bad = 0
+    for colors, shape in combos:
+        old = filter_baseline(df, color_dict, shape_dict, colors, shape)
+        new = masks.select(colors, shape)
+        old_pos = np.zeros(0, dtype=np.int64) if old is None else df.index.get_indexer(old.index)
+        bad += not np.array_equal(old_pos, new)
+
+    t0 = time.perf_counter()
+    for _ in range(REPEAT):
+        for colors, shape in combos:
+            filter_baseline(df, color_dict, shape_dict, colors, shape)
+    t_old = (time.perf_counter() - t0) / (REPEAT * len(combos))
+    t0 = time.perf_counter()
+    for _ in range(REPEAT):
+        for colors, shape in combos:
+            masks.select(colors, shape)
+    t_new = (time.perf_counter() - t0) / (REPEAT * len(combos))
+    print(f"📊 {len(combos)} 種顏色 / 外型組合：篩選結果不一致 {bad}")
+    print(f" - 改寫前：{t_old * 1e6:8.1f} µs / 請求")
+    print(f" - 遮罩：  {t_new * 1e6:8.1f} µs / 請求（{t_old / t_new:.0f}x）")
+
+    # 列位置直接交給 matcher vs df_sub
+    queries = make_queries(index, n=20)
+    mismatched = 0
+    for (colors, shape), q in zip(itertools.cycle(combos[::7]), queries):
+        df_sub = filter_baseline(df, color_dict, shape_dict, colors, shape)
+        if df_sub is None:
+            continue
+        old = [_key(m) for m in matcher.match_top_n_ocr_to_front_back(q, df_sub, top_n=4, index=index)]
+        new = [_key(m) for m in matcher.match_top_n_ocr_to_front_back(
+            q, df, top_n=4, index=index, positions=masks.select(colors, shape))]
+        mismatched += old != new
+    print(f" - matcher（df_sub vs 列位置）：不一致 {mismatched}/{len(queries)}")
+
+    bad += mismatched
+    print("✅ 完全一致" if bad == 0 else f"❌ 共 {bad} 筆不一致")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+# benchmarks/bench_fused.py
+# 融合排序（multimodal.fused_top_n）vs 逐列 Python 迴圈的參考實作：
+# 參考實作對每一列逐一算 lcs_score（每種排列 × 正 / 背面）、顏色集合交集、外型比較再加權，
+# 檢查兩者的 top-N（列位置與分數）完全相同，並比較延遲；TESTData 與合成的 50k 列 catalog 各跑一次
+#
+# 用法（在專案根目錄）：
+#   python -m benchmarks.bench_fused
+#   BENCH_SYNTH_ROWS=100000 python -m benchmarks.bench_fused
+import itertools
+import os
+import random
+import sys
+
+import numpy as np
+import pandas as pd
+
+from app.utils import matcher, multimodal
+from app.utils.data_loader import VALID_COLORS, VALID_SHAPES, generate_color_shape_dicts
+from benchmarks.bench_imprint_filter import make_synthetic_catalog
+from benchmarks.bench_matcher import _timed, make_queries
+
+EXCEL_PATH = "data/TESTData.xlsx"
+SYNTH_ROWS = int(os.environ.get("BENCH_SYNTH_ROWS", "50000"))
+N_QUERIES = int(os.environ.get("BENCH_QUERIES", "20"))
+TOP_N = 4
+SEED = 0
+
+
+def reference_top_n(ocr_texts, colors, shape, df, top_n=TOP_N, max_rank=10000):
+    """逐列計算的融合分數（與 fused_top_n 相同的定義）"""
+    w_text, w_color, w_shape = multimodal.MATCH_WEIGHT_TEXT, multimodal.MATCH_WEIGHT_COLOR, multimodal.MATCH_WEIGHT_SHAPE
+    total = w_text + w_color + w_shape
+    combos = [''.join(p).upper() for p in itertools.permutations(ocr_texts)]
+    query_colors = list(dict.fromkeys(colors))
+    scored = []
+    for pos, row in enumerate(df.to_dict("records")):
+        front, back = matcher.parse_imprint(row.get("文字", ""))
+        text = 0.0
+        for combined in combos:
+            for imprint in (front, back):
+                if imprint:
+                    text = max(text, matcher.lcs_score(combined, imprint))
+
+        rank = row.get("用量排序")
+        valid = not pd.isna(rank) and 1 <= rank <= max_rank
+        row_colors = {c.strip() for c in str(row.get("顏色", "")).split("|")} & set(VALID_COLORS) if valid else set()
+        hits = len(row_colors & set(query_colors))
+        denom = min(len(row_colors), len(query_colors))
+        color = hits / denom if denom else 0.0
+
+        row_shape = str(row.get("形狀", "")).strip()
+        row_shape = row_shape if row_shape in VALID_SHAPES else "其他"
+        shape_score = 1.0 if not shape else float(valid and row_shape == shape)
+
+        scored.append(((w_text * text + w_color * color + w_shape * shape_score) / total, pos))
+    scored.sort(key=lambda t: (-t[0], t[1]))
+    return [(pos, score) for score, pos in scored[:top_n]]
+
+
+def add_synthetic_attributes(df, seed=SEED):
+    rng = random.Random(seed)
+    df = df.copy()
+    df["用量排序"] = np.arange(1, len(df) + 1)
+    df["顏色"] = ["|".join(rng.sample(VALID_COLORS, rng.choice([1, 1, 1, 2]))) for _ in range(len(df))]
+    df["形狀"] = [rng.choice(VALID_SHAPES + ["六邊形"]) for _ in range(len(df))]
+    return df
+
+
+def bench(label, df, queries, rng):
+    max_rank = max(10000, len(df))  # 合成 catalog 的用量排序會超過預設的 10000
+    _, _, _, masks = generate_color_shape_dicts(df, end_index=max_rank, with_masks=True)
+    index = matcher.build_imprint_index(df)
+    requests = [(q, rng.sample(VALID_COLORS, rng.choice([1, 2])), rng.choice([""] + VALID_SHAPES)) for q in queries]
+
+    def run_fused():
+        return [[(index.labels.get_loc(r["row"].name), r["score"])
+                 for r in multimodal.fused_top_n(q, c, s, df, masks, index=index, top_n=TOP_N)]
+                for q, c, s in requests]
+
+    t_new, new = _timed(run_fused)
+    print(f"\n📊 {label}：{len(df)} 列，{len(requests)} 個查詢")
+    print(f" - 融合排序（NumPy）：{t_new * 1000 / len(requests):8.2f} ms / 查詢")
+    t_old, old = _timed(lambda: [reference_top_n(q, c, s, df, max_rank=max_rank) for q, c, s in requests])
+    same = sum(a == b for a, b in zip(old, new))
+    print(f" - 逐列參考實作：    {t_old * 1000 / len(requests):8.2f} ms / 查詢（{t_old / t_new:.0f}x）")
+    print(f" - top-{TOP_N} 一致：{same}/{len(requests)}")
+    return len(requests) - same
+
+
+def main():
+    rng = random.Random(SEED)
+    df = pd.read_excel(EXCEL_PATH)
+    queries = make_queries(matcher.build_imprint_index(df), n=N_QUERIES)
+    bad = bench("TESTData", df, queries, rng)
+    synth = add_synthetic_attributes(make_synthetic_catalog(matcher.build_imprint_index(df), SYNTH_ROWS))
+    bad += bench("合成 catalog", synth, queries[:5], rng)
+    print("\n✅ 完全一致" if bad == 0 else f"\n❌ 共 {bad} 筆不一致")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
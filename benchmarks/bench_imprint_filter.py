@@ -0,0 +1,100 @@
+# benchmarks/bench_imprint_filter.py
+# 字元倒排索引剪枝（matcher.CharCountFilter / MATCH_PRUNE）：
+# - TESTData 與合成的 50k 列 catalog 上，剪枝開 / 關的 /match 文字比對延遲與輸出是否一致
+# - 剪枝後的候選數
+# - 安全性：每個查詢實際分數 ≥ CANDIDATE_FLOOR 的刻字都必須留在候選裡（有漏掉就以非零狀態結束）
+#
+# 合成 catalog：從 TESTData 的刻字改字 / 插字 / 刪字，或依相同長度分佈隨機產生，約一半沒有背面刻字
+#
+# 用法（在專案根目錄）：
+#   python -m benchmarks.bench_imprint_filter
+#   BENCH_SYNTH_ROWS=100000 python -m benchmarks.bench_imprint_filter
+import os
+import random
+import sys
+
+import numpy as np
+import pandas as pd
+
+from app.utils import matcher
+from benchmarks.bench_matcher import _timed, make_queries, run_best, run_top_n
+
+EXCEL_PATH = "data/TESTData.xlsx"
+SYNTH_ROWS = int(os.environ.get("BENCH_SYNTH_ROWS", "50000"))
+N_QUERIES = int(os.environ.get("BENCH_QUERIES", "40"))
+SEED = 0
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+
+def _mutate(rng, text):
+    chars = list(text)
+    for _ in range(rng.randint(1, 3)):
+        op = rng.randrange(3)
+        if op == 0 and chars:
+            chars[rng.randrange(len(chars))] = rng.choice(ALPHABET)
+        elif op == 1 and len(chars) > 1:
+            del chars[rng.randrange(len(chars))]
+        else:
+            chars.insert(rng.randint(0, len(chars)), rng.choice(ALPHABET))
+    return "".join(chars)
+
+
+def make_synthetic_catalog(index, n_rows, seed=SEED):
+    rng = random.Random(seed)
+    imprints = [t for t in index.front + index.back if t]
+    lengths = [len(t) for t in imprints]
+
+    def imprint():
+        if rng.random() < 0.6:
+            return _mutate(rng, rng.choice(imprints))
+        return "".join(rng.choice(ALPHABET) for _ in range(rng.choice(lengths)))
+
+    texts = []
+    for _ in range(n_rows):
+        front = imprint()
+        texts.append(f"F:{front}|B:{imprint()}" if rng.random() < 0.5 else f"F:{front}")
+    return pd.DataFrame({"文字": texts})
+
+
+def check_safety(index, queries):
+    """回傳漏掉的 (查詢, 位置) 數與平均候選數"""
+    missed, sizes = 0, []
+    for q in queries:
+        combined = "".join(q).upper()
+        for lcs, filt in ((index.front_lcs, index.front_filter), (index.back_lcs, index.back_filter)):
+            must = set(np.flatnonzero(lcs.scores(combined) >= matcher.CANDIDATE_FLOOR).tolist())
+            cand = set(filt.candidates(combined, matcher.CANDIDATE_FLOOR).tolist())
+            missed += len(must - cand)
+            sizes.append(len(cand))
+    return missed, float(np.mean(sizes)) * 2
+
+
+def bench(label, df, queries):
+    index = matcher.build_imprint_index(df)
+    missed, avg_cand = check_safety(index, queries)
+    print(f"\n📊 {label}：{len(df)} 列，平均候選 {avg_cand:.0f} 筆（正 + 背），漏掉 {missed}")
+    for name, runner, kwargs in (("top_n（threshold 0.8）", run_top_n, {}),
+                                 ("best（threshold 0.0）", run_best, {})):
+        matcher.MATCH_PRUNE = False
+        t_off, off = _timed(runner, matcher, queries, df, index=index, **kwargs)
+        matcher.MATCH_PRUNE = True
+        t_on, on = _timed(runner, matcher, queries, df, index=index, **kwargs)
+        same = sum(a == b for a, b in zip(off, on))
+        print(f" - {name:<22} 不剪枝 {t_off * 1000 / len(queries):8.2f} ms，"
+              f"剪枝 {t_on * 1000 / len(queries):8.2f} ms / 查詢（{t_off / t_on:.1f}x），輸出一致 {same}/{len(queries)}")
+        missed += len(queries) - same
+    return missed
+
+
+def main():
+    df = pd.read_excel(EXCEL_PATH)
+    queries = make_queries(matcher.build_imprint_index(df), n=N_QUERIES)
+    bad = bench("TESTData", df, queries)
+    synth = make_synthetic_catalog(matcher.build_imprint_index(df), SYNTH_ROWS)
+    bad += bench("合成 catalog", synth, queries)
+    print("\n✅ 剪枝沒有漏掉任何可能達標的刻字" if bad == 0 else f"\n❌ {bad} 筆不一致 / 漏掉")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
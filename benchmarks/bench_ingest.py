@@ -0,0 +1,153 @@
+# benchmarks/bench_ingest.py
+# 讀圖後的前處理：舊流程（原圖 RGB + copy + 原圖 letterbox + 原圖裁切）
+# vs downscale-first（先縮到工作解析度偵測、框映射回原圖、只對裁切區轉 RGB）
+# 在 12MP / 48MP 輸入下比較延遲與記憶體峰值（tracemalloc 會記到 numpy / cv2 輸出陣列）
+# 另外比較 JPEG 原尺寸解碼 vs scale-on-decode（PIL draft）的解碼時間與 RSS 峰值（各在獨立子行程量測）
+#
+# YOLO 推論本身的輸入固定是 640×640，兩種流程相同，因此這裡不跑模型，
+# 用藥品在圖中的已知位置當作偵測框
+#
+# 用法（在專案根目錄）：
+#   python -m benchmarks.bench_ingest
+#   BENCH_REPEAT=10 BENCH_PICTURES=data/pictures python -m benchmarks.bench_ingest
+#   BENCH_DECODE_MAX_SIDE=2000 python -m benchmarks.bench_ingest
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from app.utils.image_io import read_image_safely
+from app.utils.pill_detection import _pick_crop_from_boxes, crop_pill, ingest_for_detection
+from app.utils.yolo_runtime import NumpyBoxes, letterbox
+
+PICTURE_ROOT = Path(os.environ.get("BENCH_PICTURES", "data/pictures"))
+REPEAT = int(os.environ.get("BENCH_REPEAT", "5"))
+DECODE_MAX_SIDE = int(os.environ.get("BENCH_DECODE_MAX_SIDE", "2000"))
+SIZES = {"12MP": (4000, 3000), "48MP": (8000, 6000)}
+PILL_FRACTION = 0.2  # 藥品寬度約佔畫面寬的 20%（手機近拍的典型比例）
+
+
+def _make_scene(size):
+    """把參考藥品圖貼到一張大背景上，回傳 (BGR 影像, 藥品框 xyxy)"""
+    w, h = size
+    scene = np.full((h, w, 3), (200, 205, 210), np.uint8)
+    cv2.randn(scene, (200, 205, 210), (6, 6, 6))
+    paths = sorted(p for p in PICTURE_ROOT.glob("*") if p.suffix.lower() in {".jpg", ".jpeg", ".png"})
+    pill = read_image_safely(paths[0]) if paths else None
+    pw = int(w * PILL_FRACTION)
+    if pill is None:
+        ph = pw // 2
+        pill = np.zeros((ph, pw, 3), np.uint8)
+        cv2.ellipse(pill, (pw // 2, ph // 2), (pw // 2 - 2, ph // 2 - 2), 0, 0, 360, (240, 240, 240), -1)
+        cv2.putText(pill, "AB12", (pw // 4, ph // 2 + ph // 8), cv2.FONT_HERSHEY_SIMPLEX, pw / 300, (60, 60, 60), 8)
+    else:
+        ph = int(pill.shape[0] * pw / pill.shape[1])
+        pill = cv2.resize(pill, (pw, ph), interpolation=cv2.INTER_CUBIC)
+    x1, y1 = (w - pw) // 2, (h - ph) // 2
+    scene[y1:y1 + ph, x1:x1 + pw] = pill
+    return scene, np.array([[x1, y1, x1 + pw, y1 + ph]], np.float32)
+
+
+def _boxes(xyxy):
+    return NumpyBoxes(xyxy, np.ones(len(xyxy), np.float32), np.zeros(len(xyxy), np.float32))
+
+
+def _legacy(image_bgr, box):
+    """舊流程：整張轉 RGB、整張 copy、原圖 letterbox，BGR/RGB 各裁一次"""
+    image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+    input_img = image_bgr.copy()
+    letterbox(input_img, 640)
+    boxes = _boxes(box)
+    return _pick_crop_from_boxes(input_img, boxes), _pick_crop_from_boxes(image_rgb, boxes)
+
+
+def _downscale_first(image_bgr, box):
+    det_img, crop_src, det_to_crop = ingest_for_detection(image_bgr)
+    letterbox(det_img, 640)
+    sx, sy = det_to_crop
+    det_box = box / np.array([sx, sy, sx, sy], np.float32)  # 模擬偵測器在工作影像上的輸出
+    return crop_pill(crop_src, _boxes(det_box), det_to_crop)
+
+
+def _measure(fn, image_bgr, box):
+    """回傳 (平均 ms, 記憶體峰值 MB, 輸出)；峰值只算前處理新配置的記憶體（不含已解碼原圖）"""
+    fn(image_bgr, box)  # 預熱
+    t0 = time.perf_counter()
+    for _ in range(REPEAT):
+        fn(image_bgr, box)
+    ms = (time.perf_counter() - t0) * 1000 / REPEAT
+
+    tracemalloc.start()
+    out = fn(image_bgr, box)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ms, peak / 1e6, out
+
+
+# 子行程只 import 解碼需要的套件，RSS 基準才不會被模型 / 框架的 import 蓋過（僅支援 Linux）
+_DECODE_CHILD = """
+import json, sys, time
+import cv2, numpy, PIL.Image, pillow_heif
+from app.utils.image_io import read_image_safely
+
+def hwm_kb():
+    # ru_maxrss 會沿用 exec 前父行程的峰值，改讀 /proc 的 VmHWM
+    with open("/proc/self/status") as f:
+        return next(int(l.split()[1]) for l in f if l.startswith("VmHWM"))
+
+path, max_side, repeat = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+base = hwm_kb()
+times = []
+for _ in range(repeat):
+    t0 = time.perf_counter()
+    img = read_image_safely(path, max_side=max_side)
+    times.append((time.perf_counter() - t0) * 1000)
+    shape = img.shape
+    del img
+peak = hwm_kb()
+print(json.dumps({"ms": sorted(times)[len(times) // 2], "size": shape[1::-1], "rss_mb": (peak - base) / 1024}))
+"""
+
+
+def _measure_decode(path, max_side):
+    """獨立子行程解碼 REPEAT 次，回傳 (中位數 ms, 解出尺寸, RSS 峰值增量 MB)"""
+    out = subprocess.run(
+        [sys.executable, "-c", _DECODE_CHILD, str(path), str(max_side), str(REPEAT)],
+        capture_output=True, text=True, check=True,
+    ).stdout.strip().splitlines()[-1]
+    r = json.loads(out)
+    return r["ms"], r["size"], r["rss_mb"]
+
+
+def main():
+    print(f"📐 DET_WORK_MAX_SIDE / CROP_MAX_SIDE 依 pill_detection 設定；每項重複 {REPEAT} 次")
+    for label, size in SIZES.items():
+        scene, box = _make_scene(size)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / f"{label}.jpg"
+            cv2.imwrite(str(path), scene, [int(cv2.IMWRITE_JPEG_QUALITY), 92])
+            t0 = time.perf_counter()
+            image_bgr = read_image_safely(path)
+            decode_ms = (time.perf_counter() - t0) * 1000
+            full = _measure_decode(path, 0)
+            scaled = _measure_decode(path, DECODE_MAX_SIDE)
+
+        old_ms, old_mb, (old_bgr, _) = _measure(_legacy, image_bgr, box)
+        new_ms, new_mb, (new_bgr, _) = _measure(_downscale_first, image_bgr, box)
+        print(f"\n📊 {label}（{size[0]}×{size[1]}，解碼 {decode_ms:.0f} ms / {image_bgr.nbytes / 1e6:.0f} MB）")
+        print(f" - 舊流程：       {old_ms:7.1f} ms，前處理峰值 {old_mb:7.1f} MB，裁切 {old_bgr.shape[1]}×{old_bgr.shape[0]}")
+        print(f" - downscale-first：{new_ms:7.1f} ms，前處理峰值 {new_mb:7.1f} MB，裁切 {new_bgr.shape[1]}×{new_bgr.shape[0]}")
+        print(f" - 加速 {old_ms / new_ms:.1f}x，記憶體 -{old_mb - new_mb:.1f} MB")
+        for tag, (ms, size, rss) in (("原尺寸解碼", full), (f"draft ≥{DECODE_MAX_SIDE}", scaled)):
+            print(f" - JPEG {tag:<12}：{ms:7.1f} ms，RSS 峰值 +{rss:6.1f} MB，解出 {size[0]}×{size[1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/bench_keyword_rules.py
+# 關鍵字規則（keyword_rules.KeywordRuleEngine，Aho–Corasick）vs 改寫前寫死的 ACETYLCYSTEINE / ACTEIN 特例：
+# 1. 含 / 不含關鍵字的查詢（整個 catalog 與顏色 / 外型篩選後的子集），兩個 matcher 的輸出與改寫前完全相同
+# 2. 命中時的延遲：改寫前每個請求 df["文字"].str.contains(...) 掃整個 DataFrame，規則引擎只掃一次 OCR 字串
+# 3. 規則數量增加（合成的商品名規則）時，每個請求的規則比對時間
+# 第 1 項有任何不一致時以非零狀態結束
+#
+# 用法（在專案根目錄）：
+#   python -m benchmarks.bench_keyword_rules
+import contextlib
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.utils import matcher
+from app.utils.keyword_rules import AhoCorasick, KeywordRuleEngine, load_rule_table
+from benchmarks import matcher_baseline as baseline
+from benchmarks.bench_matcher import _key, _timed
+
+EXCEL_PATH = "data/TESTData.xlsx"
+REPEAT = 2000
+SEED = 0
+
+QUERIES = [
+    ["ACTEIN"], ["actein", "600"], ["ACETYL", "CYSTEINE"], ["ACETYLCYSTEINE 200MG"],
+    ["XXACTEINXX"], ["ACT", "EIN"], ["YSP"], ["T25"], ["ACTE1N"],
+]
+
+
+def _compare(df, index, positions=None):
+    df_sub = df if positions is None else df.iloc[positions]
+    bad = 0
+    for q in QUERIES:
+        old_top = [_key(m) for m in baseline.match_top_n_ocr_to_front_back(q, df_sub, top_n=4)]
+        new_top = [_key(m) for m in matcher.match_top_n_ocr_to_front_back(q, df, top_n=4, index=index,
+                                                                          positions=positions)]
+        old_best = {s: _key(m) for s, m in (baseline.match_ocr_to_front_back_by_permuted_ocr(q, df_sub) or {}).items()}
+        new_best = {s: _key(m) for s, m in (matcher.match_ocr_to_front_back_by_permuted_ocr(
+            q, df, index=index, positions=positions) or {}).items()}
+        if old_top != new_top or old_best != new_best:
+            print(f"   ❗ {q}: {old_top} ≠ {new_top}")
+            bad += 1
+    return bad
+
+
+def check_automaton(rng, n_cases=300):
+    """Aho–Corasick 找到的 pattern 與逐一 `in` 比對相同（小字母表 → 大量重疊 / 後綴 pattern）"""
+    bad = 0
+    for _ in range(n_cases):
+        patterns = ["".join(rng.choice("AB1") for _ in range(rng.randint(1, 5))) for _ in range(rng.randint(1, 8))]
+        text = "".join(rng.choice("AB1C") for _ in range(rng.randint(0, 30)))
+        bad += AhoCorasick(patterns).search(text) != {i for i, p in enumerate(patterns) if p in text}
+    return bad
+
+
+def _per_call_us(fn, repeat=REPEAT):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def main():
+    df = pd.read_excel(EXCEL_PATH)
+    index = matcher.build_imprint_index(df)
+    print(f"📋 規則表：{len(load_rule_table())} 條，catalog 中有效 {len(index.keyword_rules)} 條")
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        bad = _compare(df, index)
+        no_rule_row = np.flatnonzero(df["批價碼"].astype(str) != "OACE1")  # 篩選結果不含規則指向的藥
+        bad += _compare(df, index, positions=no_rule_row)
+    print(f"📊 {len(QUERIES)} 個查詢 × 2 種範圍：與改寫前不一致 {bad}")
+    rng = random.Random(SEED)
+    ac_bad = check_automaton(rng)
+    print(f" - Aho–Corasick vs 逐一比對：不一致 {ac_bad}")
+    bad += ac_bad
+
+    combined = "ACTEIN600"
+    t_old = _per_call_us(lambda: df[df["文字"].str.contains("ACETYLCYSTEINE|ACTEIN", case=False, na=False)], 200)
+    t_new = _per_call_us(lambda: index.keyword_rules.match(combined))
+    print(f" - 命中時：改寫前 str.contains {t_old:8.1f} µs，規則引擎 {t_new:6.1f} µs / 請求")
+
+    codes = [c for c in df["批價碼"].dropna().astype(str)]
+    ocr = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789") for _ in range(24))
+    for n_rules in (1, 100, 1000, 10000):
+        rules = list(load_rule_table()) + [
+            {"keywords": ["".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(rng.randint(5, 12)))],
+             "drug_id": rng.choice(codes)} for _ in range(n_rules - 1)]
+        t0 = time.perf_counter()
+        engine = KeywordRuleEngine(rules, df)
+        build_ms = (time.perf_counter() - t0) * 1000
+        print(f" - {n_rules:>5} 條規則：編譯 {build_ms:7.1f} ms，每個請求比對 {_per_call_us(lambda: engine.match(ocr)):6.1f} µs")
+
+    print("✅ 與改寫前完全一致" if bad == 0 else f"❌ 共 {bad} 筆不一致")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# benchmarks/bench_matcher.py
+# /match 文字比對延遲：改寫前（matcher_baseline：iterrows + 每列重新解析「文字」）
+# vs 目前的 matcher（刻字索引 + bit-parallel LCS），並檢查兩者輸出完全一致
+#
+# 查詢由 TESTData 的刻字產生：切成 1~3 段（模擬 OCR 分行，matcher 會排列組合），
+# 部分查詢改掉一個字元（模擬 OCR 認錯），另加少量完全不相干的雜訊查詢
+# 舊版的逐列 debug print 導到 /dev/null，不把終端機輸出算進去
+#
+# 用法（在專案根目錄）：
+#   python -m benchmarks.bench_matcher
+#   BENCH_QUERIES=100 python -m benchmarks.bench_matcher
+import contextlib
+import math
+import os
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.utils import matcher
+from benchmarks import matcher_baseline as baseline
+
+EXCEL_PATH = "data/TESTData.xlsx"
+N_QUERIES = int(os.environ.get("BENCH_QUERIES", "40"))
+SEED = 0
+
+
+def make_queries(index, n=N_QUERIES, seed=SEED):
+    rng = random.Random(seed)
+    imprints = [t for t in index.front + index.back if t]
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    queries = []
+    for i in range(n):
+        if i % 10 == 9:
+            queries.append(["".join(rng.choice(alphabet) for _ in range(rng.randint(3, 8)))])
+            continue
+        text = list(rng.choice(imprints))
+        if len(text) > 2 and rng.random() < 0.5:
+            text[rng.randrange(len(text))] = rng.choice(alphabet)
+        text = "".join(text)
+        k = rng.randint(1, min(3, len(text)))
+        cuts = sorted(rng.sample(range(1, len(text)), k - 1)) if k > 1 else []
+        parts = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+        queries.append(parts)
+    return queries
+
+
+def _key(match):
+    """比較用：分數、比對到的字串、面、列 index"""
+    if match is None:
+        return None
+    row = match.get("row")
+    return (round(match["score"], 12), match.get("text"), match.get("match"), match.get("side"),
+            None if row is None else row.name)
+
+
+def run_top_n(mod, queries, df, **kwargs):
+    return [[_key(m) for m in mod.match_top_n_ocr_to_front_back(q, df, threshold=0.8, top_n=4, **kwargs)]
+            for q in queries]
+
+
+def run_best(mod, queries, df, **kwargs):
+    out = []
+    for q in queries:
+        res = mod.match_ocr_to_front_back_by_permuted_ocr(q, df, threshold=0.0, **kwargs) or {}
+        out.append({side: _key(m) for side, m in res.items()})
+    return out
+
+
+def run_route_two_pass(mod, queries, df, **kwargs):
+    """改寫前 /match 的流程：top-N；沒有結果時再以 threshold=0.0 重掃一次取各面最佳"""
+    out = []
+    for q in queries:
+        top = mod.match_top_n_ocr_to_front_back(q, df, threshold=0.8, top_n=4, **kwargs)
+        best = None
+        if not top:
+            res = mod.match_ocr_to_front_back_by_permuted_ocr(q, df, threshold=0.0, **kwargs) or {}
+            best = {side: _key(m) for side, m in res.items()}
+        out.append(([_key(m) for m in top], best))
+    return out
+
+
+def run_route_single_pass(mod, queries, df, **kwargs):
+    """目前 /match 的流程：match_ocr 一次算完"""
+    out = []
+    for q in queries:
+        res = mod.match_ocr(q, df, threshold=0.8, top_n=4, **kwargs)
+        best = None if res["top"] else {side: _key(m) for side, m in res["best"].items()}
+        out.append(([_key(m) for m in res["top"]], best))
+    return out
+
+
+def _timed(fn, *args, **kwargs):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        t0 = time.perf_counter()
+        out = fn(*args, **kwargs)
+        return time.perf_counter() - t0, out
+
+
+def main():
+    df = pd.read_excel(EXCEL_PATH)
+    t0 = time.perf_counter()
+    index = matcher.build_imprint_index(df)
+    build_ms = (time.perf_counter() - t0) * 1000
+    queries = make_queries(index)
+    n_perm = np.mean([math.factorial(len(q)) for q in queries])
+    print(f"📚 {len(df)} 列，有刻字 {int(index.has_text.sum())} 列；索引建立 {build_ms:.1f} ms")
+    print(f"🔎 {len(queries)} 個查詢，平均 {n_perm:.1f} 種排列")
+
+    for name, runner in (("match_top_n_ocr_to_front_back", run_top_n),
+                         ("match_ocr_to_front_back_by_permuted_ocr", run_best)):
+        t_old, old = _timed(runner, baseline, queries, df)
+        t_new, new = _timed(runner, matcher, queries, df, index=index)
+        same = sum(a == b for a, b in zip(old, new))
+        print(f"\n📊 {name}")
+        print(f" - 改寫前：{t_old * 1000 / len(queries):8.2f} ms / 查詢")
+        print(f" - 目前版本：{t_new * 1000 / len(queries):8.2f} ms / 查詢（{t_old / t_new:.1f}x）")
+        print(f" - 輸出一致：{same}/{len(queries)}")
+        if same != len(queries):
+            for q, a, b in zip(queries, old, new):
+                if a != b:
+                    print(f"   ❗ {q}: {a} ≠ {b}")
+                    break
+
+    # /match 流程：改寫前（兩次掃描）vs match_ocr（單次掃描）；另外單看需要低信心 fallback 的查詢
+    fallback = [q for q, (top, _) in zip(queries, run_route_two_pass(matcher, queries, df, index=index)) if not top]
+    for name, qs in (("/match 流程（全部查詢）", queries), ("/match 流程（需要 fallback 的查詢）", fallback)):
+        if not qs:
+            continue
+        t_old, old = _timed(run_route_two_pass, baseline, qs, df)
+        t_two, two = _timed(run_route_two_pass, matcher, qs, df, index=index)
+        t_new, new = _timed(run_route_single_pass, matcher, qs, df, index=index)
+        same = sum(a == b == c for a, b, c in zip(old, two, new))
+        print(f"\n📊 {name}：{len(qs)} 個查詢")
+        print(f" - 改寫前：    {t_old * 1000 / len(qs):8.2f} ms / 查詢")
+        print(f" - 兩次掃描：  {t_two * 1000 / len(qs):8.2f} ms / 查詢")
+        print(f" - match_ocr： {t_new * 1000 / len(qs):8.2f} ms / 查詢（比兩次掃描 {t_two / t_new:.1f}x）")
+        print(f" - 輸出一致：{same}/{len(qs)}")
+
+
+if __name__ == "__main__":
+    main()
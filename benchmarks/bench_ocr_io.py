@@ -0,0 +1,80 @@
+# benchmarks/bench_ocr_io.py
+# OCR 暫存檔路徑 vs 記憶體路徑：每次上傳（8 個角度）的延遲與磁碟 I/O 比較
+#
+# 用法（在專案根目錄）：
+#   python -m benchmarks.bench_ocr_io
+#   BENCH_N=20 BENCH_PICTURES=data/pictures python -m benchmarks.bench_ocr_io
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.utils.image_io import read_image_safely
+from app.utils.ocr_utils import recognize_with_openocr, recognize_with_openocr_array
+from app.utils.pill_detection import get_ocr_engine
+from app.utils.shape_color_utils import rotate_image_by_angle
+
+PICTURE_ROOT = Path(os.environ.get("BENCH_PICTURES", "data/pictures"))
+N_IMAGES = int(os.environ.get("BENCH_N", "10"))
+ANGLES = (0, 45, 90, 135, 180, 225, 270, 315)
+TEMP_FOLDER = Path("./temp_imgs")
+
+
+def _load_images():
+    paths = sorted(p for p in PICTURE_ROOT.glob("*") if p.suffix.lower() in {".jpg", ".jpeg", ".png"})
+    imgs = []
+    for p in paths[:N_IMAGES]:
+        img = read_image_safely(p)
+        if img is not None:
+            imgs.append((p.name, img))
+    return imgs
+
+
+def _run_request(img, engine, use_temp_file):
+    """模擬一次上傳：8 個角度各跑一次 OCR，回傳 (耗時秒數, 暫存檔寫入位元組)"""
+    written = 0
+    t0 = time.perf_counter()
+    for angle in ANGLES:
+        rotated = rotate_image_by_angle(img, angle)
+        name = f"bench_旋轉{angle}"
+        if use_temp_file:
+            recognize_with_openocr(rotated, name=name, ocr_engine=engine)
+            written += (TEMP_FOLDER / f"temp_{name}.jpg").stat().st_size
+        else:
+            recognize_with_openocr_array(rotated, name=name, ocr_engine=engine)
+    return time.perf_counter() - t0, written
+
+
+def main():
+    imgs = _load_images()
+    if not imgs:
+        print(f"❗ 找不到圖片：{PICTURE_ROOT}")
+        return
+
+    engine = get_ocr_engine()
+    # 預熱，避免把 ONNX session 初始化算進第一筆
+    recognize_with_openocr_array(imgs[0][1], ocr_engine=engine)
+
+    stats = {"temp_file": [], "in_memory": []}
+    io_bytes = []
+    for name, img in imgs:
+        t_file, written = _run_request(img, engine, use_temp_file=True)
+        t_mem, _ = _run_request(img, engine, use_temp_file=False)
+        stats["temp_file"].append(t_file)
+        stats["in_memory"].append(t_mem)
+        # 暫存檔路徑：每個角度寫一次、OpenOCR 再整檔讀回一次
+        io_bytes.append(2 * written)
+        print(f"  {name:<16} temp={t_file * 1000:8.1f} ms  mem={t_mem * 1000:8.1f} ms  I/O={2 * written / 1024:8.1f} KB")
+
+    t_file = np.array(stats["temp_file"])
+    t_mem = np.array(stats["in_memory"])
+    print(f"\n📊 每次上傳（{len(ANGLES)} 角度）平均，共 {len(imgs)} 張：")
+    print(f" - 暫存檔路徑：{t_file.mean() * 1000:.1f} ms（p95 {np.percentile(t_file, 95) * 1000:.1f} ms）")
+    print(f" - 記憶體路徑：{t_mem.mean() * 1000:.1f} ms（p95 {np.percentile(t_mem, 95) * 1000:.1f} ms）")
+    print(f" - 節省：{(t_file.mean() - t_mem.mean()) * 1000:.1f} ms / 次（{(1 - t_mem.mean() / t_file.mean()):.1%}）")
+    print(f" - 省下磁碟 I/O：{np.mean(io_bytes) / 1024:.1f} KB / 次（寫 + 讀）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/bench_upload.py
+# /upload 請求解析：舊版 base64 JSON vs multipart/form-data vs raw image/* body
+# 量測「請求解析（到拿到可解碼的 stream）」與「解析 + Pillow 解碼」的延遲、
+# 解析階段 Python 端的記憶體峰值（tracemalloc：JSON 字串 / base64 解碼 / body 複本），以及傳輸量
+#
+# 用法（在專案根目錄）：
+#   python -m benchmarks.bench_upload
+#   BENCH_REPEAT=20 python -m benchmarks.bench_upload
+import base64
+import io
+import json
+import os
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from flask import Flask
+from werkzeug.test import EnvironBuilder
+
+from app.route import InMemoryUploadRequest, read_upload_stream
+from app.utils.image_io import open_image_scaled
+from benchmarks.bench_ingest import SIZES, _make_scene
+
+REPEAT = int(os.environ.get("BENCH_REPEAT", "5"))
+
+
+def _builders(jpeg):
+    data_url = "data:image/jpeg;base64," + base64.b64encode(jpeg).decode("ascii")
+    body = json.dumps({"image": data_url})
+    # 回傳產生 EnvironBuilder 參數的函式（multipart 的檔案物件用過會被關閉，每次重建）
+    return {
+        "json (base64)": lambda: dict(data=body, content_type="application/json"),
+        "multipart": lambda: dict(data={"image": (io.BytesIO(jpeg), "upload.jpg", "image/jpeg")},
+                                  content_type="multipart/form-data"),
+        "raw image/jpeg": lambda: dict(data=jpeg, content_type="image/jpeg"),
+    }
+
+
+def _environ(make_kwargs):
+    """每次都重建 environ（body stream 只能讀一次）"""
+    env = EnvironBuilder(method="POST", path="/upload", **make_kwargs()).get_environ()
+    return env, int(env.get("CONTENT_LENGTH") or 0)
+
+
+def _run(app, make_kwargs, decode):
+    env, _ = _environ(make_kwargs)
+    with app.request_context(env):
+        t0 = time.perf_counter()
+        stream = read_upload_stream()
+        if decode:
+            open_image_scaled(stream).load()
+        return time.perf_counter() - t0
+
+
+def _peak_mb(app, make_kwargs):
+    env, _ = _environ(make_kwargs)
+    with app.request_context(env):
+        tracemalloc.start()
+        read_upload_stream()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return peak / 1e6
+
+
+def main():
+    app = Flask(__name__)
+    app.request_class = InMemoryUploadRequest
+    for label, size in SIZES.items():
+        scene, _ = _make_scene(size)
+        ok, buf = cv2.imencode(".jpg", scene, [int(cv2.IMWRITE_JPEG_QUALITY), 92])
+        jpeg = buf.tobytes()
+        print(f"\n📊 {label}（{size[0]}×{size[1]}，JPEG {len(jpeg) / 1e6:.1f} MB）")
+        for name, make_kwargs in _builders(jpeg).items():
+            _run(app, make_kwargs, decode=False)  # 預熱
+            parse = np.median([_run(app, make_kwargs, decode=False) for _ in range(REPEAT)]) * 1000
+            total = np.median([_run(app, make_kwargs, decode=True) for _ in range(REPEAT)]) * 1000
+            peak = _peak_mb(app, make_kwargs)
+            wire = _environ(make_kwargs)[1]
+            print(f" - {name:<15} 傳輸 {wire / 1e6:6.1f} MB，解析 {parse:7.1f} ms，"
+                  f"解析 + 解碼 {total:7.1f} ms，解析峰值 {peak:6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# benchmarks/check_drug_image_server.py
+# 透過真的 HTTP 伺服器（Werkzeug make_server，與 gunicorn 一樣走 WSGI write 流程）抓 /drug-image
+# app.test_client() 不經過 WSGI server 的 bytes 檢查，回應內容型別錯誤時不會報錯，所以另外檢查
+# - 暫存目錄寫一個小打包檔（兩個批價碼 × sm / md），伺服器從打包檔回應
+# - 內容與打包進去的 bytes 完全相同、Content-Length / Content-Type 正確
+# - If-None-Match 帶 ETag → 304；不存在的批價碼 → 404
+# - 沒有打包檔：從原圖產生單張縮圖回應（圖片根目錄刻意用相對路徑，send_file 不能接在 app/ 後面）
+# 有任何不符時以非零狀態結束
+#
+# 用法（在專案根目錄）：
+#   python -m benchmarks.check_drug_image_server
+import io
+import os
+import sys
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from flask import Flask
+from PIL import Image
+from werkzeug.serving import make_server
+
+import app.utils.drug_images as drug_images
+from app.route import register_routes
+from app.utils.image_pack import ImagePack, ImagePackWriter
+
+IMAGES = {
+    ("CHK001", "sm"): b"\xff\xd8\xff\xe0" + bytes(range(256)) * 4 + b"\xff\xd9",
+    ("CHK001", "md"): b"\xff\xd8\xff\xe0" + bytes(range(255, -1, -1)) * 40 + b"\xff\xd9",
+    ("CHK002", "md"): b"\xff\xd8\xff\xe0" + b"\x00" * 70000 + b"\xff\xd9",
+}
+
+
+def _fetch(url, headers=None):
+    req = urllib.request.Request(url, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return resp.status, dict(resp.headers), resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), e.read()
+
+
+def _serve():
+    app = Flask(__name__)
+    app.df = None
+    register_routes(app, "check")
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def _check_pack(tmp):
+    bad = 0
+    path = os.path.join(tmp, "drug_images.pack")
+    with ImagePackWriter(path, fmt="jpeg", sizes={"sm": 320, "md": 800}) as w:
+        for (code, variant), data in IMAGES.items():
+            w.add(code, variant, data, 1700000000.0)
+    drug_images._pack, drug_images._pack_loaded = ImagePack(path), True
+    server, base = _serve()
+    try:
+        print("📦 打包檔")
+        for (code, variant), data in IMAGES.items():
+            status, headers, body = _fetch(f"{base}/drug-image/{code}?size={variant}")
+            ok = (status == 200 and body == data
+                  and int(headers.get("Content-Length", -1)) == len(data)
+                  and headers.get("Content-Type", "").startswith("image/jpeg"))
+            etag = headers.get("ETag")
+            status_304, _, body_304 = _fetch(f"{base}/drug-image/{code}?size={variant}",
+                                             {"If-None-Match": etag or ""})
+            ok = ok and etag is not None and status_304 == 304 and body_304 == b""
+            print(f"   {'✅' if ok else '❌'} {code} {variant}: {status} {len(body)}/{len(data)} bytes，"
+                  f"If-None-Match → {status_304}")
+            bad += not ok
+        status, _, _ = _fetch(f"{base}/drug-image/NOPE999")
+        print(f"   {'✅' if status == 404 else '❌'} 不存在的批價碼 → {status}")
+        bad += status != 404
+    finally:
+        server.shutdown()
+    return bad
+
+
+def _check_thumbnail(tmp):
+    """沒有打包檔：PICTURE_ROOT / THUMB_ROOT 用相對於工作目錄的路徑"""
+    bad = 0
+    cwd = os.getcwd()
+    roots = drug_images.PICTURE_ROOT, drug_images.THUMB_ROOT
+    os.chdir(tmp)
+    drug_images._pack, drug_images._pack_loaded = None, True
+    drug_images.PICTURE_ROOT, drug_images.THUMB_ROOT = Path("pictures"), Path("thumbnails")
+    drug_images.PICTURE_ROOT.mkdir()
+    Image.new("RGB", (1600, 1200), (200, 40, 40)).save(drug_images.PICTURE_ROOT / "CHK003.jpg", quality=90)
+    server, base = _serve()
+    try:
+        print("🖼️ 單張縮圖（沒有打包檔）")
+        status, headers, body = _fetch(f"{base}/drug-image/CHK003")
+        ok = status == 200 and headers.get("Content-Type", "").startswith("image/jpeg")
+        if ok:
+            with Image.open(io.BytesIO(body)) as img:
+                size = img.size
+            ok = max(size) == drug_images.THUMB_MAX_SIDE
+        etag = headers.get("ETag")
+        status_304, _, _ = _fetch(f"{base}/drug-image/CHK003", {"If-None-Match": etag or ""})
+        ok = ok and etag is not None and status_304 == 304
+        print(f"   {'✅' if ok else '❌'} CHK003: {status} {len(body)} bytes，If-None-Match → {status_304}")
+        bad += not ok
+        status, _, _ = _fetch(f"{base}/drug-image/NOPE999")
+        print(f"   {'✅' if status == 404 else '❌'} 沒有原圖的批價碼 → {status}")
+        bad += status != 404
+    finally:
+        server.shutdown()
+        os.chdir(cwd)
+        drug_images.PICTURE_ROOT, drug_images.THUMB_ROOT = roots
+    return bad
+
+
+def main():
+    bad = 0
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            bad += _check_pack(tmp)
+        with tempfile.TemporaryDirectory() as tmp:
+            bad += _check_thumbnail(tmp)
+    finally:
+        drug_images._pack, drug_images._pack_loaded = None, False
+
+    print("✅ 真實伺服器回應正確" if bad == 0 else f"❌ 共 {bad} 項不符")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
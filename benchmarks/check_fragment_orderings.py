@@ -0,0 +1,98 @@
+# benchmarks/check_fragment_orderings.py
+# OCR 片段排列的回歸檢查：
+# 1. 片段數 k 的 k! ≤ MATCH_MAX_ORDERINGS（預設不設上限 = 全部窮舉）→ 兩個 matcher 的輸出必須與改寫前（matcher_baseline）完全相同
+# 2. beam search（寬度 = MATCH_MAX_ORDERINGS，沒設定時用 BEAM_WIDTH）vs 完整窮舉：比較最佳正面 / 背面分數與耗時，
+#    任一查詢的分數落差超過 BEAM_MAX_GAP 即視為失敗
+# 查詢：取 catalog 的正面 + 背面刻字切成 k 段後打亂順序（模擬 OCR 框的順序不固定），部分改錯一個字
+# 第 1 項有任何不一致、或第 2 項落差超過容許值時以非零狀態結束
+#
+# 用法（在專案根目錄）：
+#   python -m benchmarks.check_fragment_orderings
+#   MATCH_MAX_ORDERINGS=240 python -m benchmarks.check_fragment_orderings
+import math
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+from app.utils import matcher
+from benchmarks import matcher_baseline as baseline
+from benchmarks.bench_matcher import _timed, run_best, run_top_n
+
+EXCEL_PATH = "data/TESTData.xlsx"
+SEED = 0
+EXACT_QUERIES = {3: 8, 4: 6, 5: 3}  # 片段數: 查詢數（改寫前的版本很慢，數量不多）
+BEAM_QUERIES = {6: 10, 7: 10, 8: 5}
+BEAM_WIDTH = 120
+BEAM_MAX_GAP = float(os.environ.get("BEAM_MAX_GAP", "0.15"))  # beam 最佳分數比完整窮舉低多少以內可以接受
+
+
+def make_fragment_queries(index, k, n, rng):
+    texts = [f + b for f, b in zip(index.front, index.back) if len(f + b) >= k]
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    queries = []
+    for _ in range(n):
+        text = list(rng.choice(texts))
+        if rng.random() < 0.5:
+            text[rng.randrange(len(text))] = rng.choice(alphabet)
+        text = "".join(text)
+        cuts = sorted(rng.sample(range(1, len(text)), k - 1))
+        parts = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+        rng.shuffle(parts)
+        queries.append(parts)
+    return queries
+
+
+def _best_scores(res):
+    res = res or {}
+    return tuple(round(res[side][0], 12) if res.get(side) else 0.0 for side in ("front", "back"))
+
+
+def main():
+    rng = random.Random(SEED)
+    df = pd.read_excel(EXCEL_PATH)
+    index = matcher.build_imprint_index(df)
+    print(f"⚙️ MATCH_MAX_ORDERINGS = {matcher.MATCH_MAX_ORDERINGS}")
+
+    bad = 0
+    print("\n📊 窮舉範圍內：與改寫前逐筆比對")
+    for k, n in EXACT_QUERIES.items():
+        if math.factorial(k) > matcher.MATCH_MAX_ORDERINGS:
+            continue
+        queries = make_fragment_queries(index, k, n, rng)
+        for name, runner in (("top_n", run_top_n), ("best", run_best)):
+            t_old, old = _timed(runner, baseline, queries, df)
+            t_new, new = _timed(runner, matcher, queries, df, index=index)
+            same = sum(a == b for a, b in zip(old, new))
+            bad += len(queries) - same
+            print(f" - k={k} {name:<5}：一致 {same}/{len(queries)}，"
+                  f"{t_old * 1000 / n:8.1f} → {t_new * 1000 / n:6.1f} ms / 查詢")
+
+    width = matcher.MATCH_MAX_ORDERINGS if math.isfinite(matcher.MATCH_MAX_ORDERINGS) else BEAM_WIDTH
+    drift = 0
+    print(f"\n📊 beam search（寬度 {width}）vs 完整窮舉：最佳正面 / 背面分數（容許落差 {BEAM_MAX_GAP}）")
+    for k, n in BEAM_QUERIES.items():
+        queries = make_fragment_queries(index, k, n, rng)
+        t_full, full = _timed(run_best, matcher, queries, df, index=index, max_orderings=math.inf)
+        t_beam, beam = _timed(run_best, matcher, queries, df, index=index, max_orderings=width)
+        full_scores = [_best_scores(r) for r in full]
+        beam_scores = [_best_scores(r) for r in beam]
+        same = sum(a == b for a, b in zip(full_scores, beam_scores))
+        worst = max(max(f - b for f, b in zip(fs, bs)) for fs, bs in zip(full_scores, beam_scores))
+        over = worst > BEAM_MAX_GAP + 1e-9
+        drift += over
+        print(f" - {'❌' if over else '✅'} k={k}（{math.factorial(k)} 種排列）：最佳分數相同 {same}/{n}，"
+              f"最大落差 {worst:.3f}，{t_full * 1000 / n:8.1f} → {t_beam * 1000 / n:6.1f} ms / 查詢")
+
+    print("\n✅ 窮舉範圍內完全一致" if bad == 0 else f"\n❌ 共 {bad} 筆與改寫前不一致")
+    print("✅ beam 落差在容許範圍內" if drift == 0 else f"❌ {drift} 種片段數的 beam 落差超過 {BEAM_MAX_GAP}")
+    return 1 if bad or drift else 0
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    code = main()
+    print(f"（{time.perf_counter() - start:.0f}s）")
+    sys.exit(code)
@@ -0,0 +1,79 @@
+# benchmarks/check_lcs_parity.py
+# 檢查 bit-parallel LCS（matcher.BitParallelLCS）與 lcs_score 完全一致（分數逐一 ==，不是近似）
+# - catalog 每個刻字 × 全部刻字（正面 / 背面兩組）
+# - 隨機 OCR 字串、刻字改字 / 刪字 / 插字 / 重複、大小寫混用、catalog 沒有的字元
+# - 超過 64 字元的刻字（走 Python int 路徑）
+# 有任何不一致時以非零狀態結束
+#
+# 用法（在專案根目錄）：
+#   python -m benchmarks.check_lcs_parity
+import random
+import sys
+
+import pandas as pd
+
+from app.utils.matcher import BitParallelLCS, build_imprint_index, lcs_score
+
+EXCEL_PATH = "data/TESTData.xlsx"
+SEED = 0
+N_RANDOM = 2000
+
+
+def _check(engine, strings, queries, label):
+    bad = 0
+    for q in queries:
+        got = engine.scores(q)
+        for s, g in zip(strings, got):
+            want = lcs_score(q, s) if s else 0.0
+            if g != want:
+                if bad < 5:
+                    print(f"   ❗ {label}: lcs_score({q!r}, {s!r}) = {want} ≠ {g}")
+                bad += 1
+    print(f" - {label}：{len(queries)} 個查詢 × {len(strings)} 個刻字，不一致 {bad}")
+    return bad
+
+
+def _perturb(rng, text, alphabet):
+    chars = list(text)
+    op = rng.randrange(5)
+    if op == 0 and chars:
+        chars[rng.randrange(len(chars))] = rng.choice(alphabet)
+    elif op == 1 and chars:
+        del chars[rng.randrange(len(chars))]
+    elif op == 2:
+        chars.insert(rng.randint(0, len(chars)), rng.choice(alphabet))
+    elif op == 3:
+        chars = chars * 2
+    else:
+        chars = [c.lower() if rng.random() < 0.5 else c for c in chars]
+    return "".join(chars)
+
+
+def main():
+    rng = random.Random(SEED)
+    index = build_imprint_index(pd.read_excel(EXCEL_PATH))
+    imprints = sorted({t for t in index.front + index.back if t})
+    alphabet = sorted(set("".join(imprints))) + list("xyz#-Ωé")
+
+    queries = list(imprints) + ["", " ", "?"]
+    for _ in range(N_RANDOM):
+        if rng.random() < 0.5:
+            queries.append(_perturb(rng, rng.choice(imprints), alphabet))
+        else:
+            queries.append("".join(rng.choice(alphabet) for _ in range(rng.randint(1, 20))))
+
+    bad = 0
+    print(f"📚 刻字 {len(imprints)} 種（最長 {max(map(len, imprints))} 字元），查詢 {len(queries)} 個")
+    bad += _check(index.front_lcs, index.front, queries, "正面")
+    bad += _check(index.back_lcs, index.back, queries, "背面")
+
+    long_strings = ["".join(rng.choice(alphabet) for _ in range(n)) for n in (63, 64, 65, 130)] + imprints[:20]
+    long_queries = [_perturb(rng, s, alphabet) for s in long_strings] + queries[:200]
+    bad += _check(BitParallelLCS(long_strings), long_strings, long_queries, "長字串（> 64 字元）")
+
+    print("✅ 完全一致" if bad == 0 else f"❌ 共 {bad} 筆不一致")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
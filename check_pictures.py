@@ -1,20 +1,53 @@
 # app/check_pictures.py
+# 參考藥品圖檢查 + 資產編譯：
+# 1. 對照 Excel 的批價碼，列出缺圖 / 只有非 .jpg 圖片的藥物（reports/missing_pictures.xlsx）
+# 2. 把每張參考圖縮成多種解析度，寫進單一打包檔（伺服器 mmap 後直接切片回應 /drug-image）
+#
+# 用法（在專案根目錄）：
+#   python check_pictures.py                                   # 報表 + 打包檔
+#   python check_pictures.py --pictures data/pictures --format webp
+#   python check_pictures.py --no-pack                         # 只出報表
 
+import argparse
+import io
 import os
+import time
 import pandas as pd
 from pathlib import Path
 
+from app.utils.drug_images import DRUG_IMAGE_PACK, is_valid_code
+from app.utils.image_pack import ImagePackWriter
+
 # 路徑設定
 EXCEL_PATH = Path("data/TESTData.xlsx")
-PICTURE_ROOT = Path(r"C:\Users\92102\OneDrive - NTHU\桌面\大三下\畢業專題\APP_新版本\data\pictures")
+PICTURE_ROOT = Path(os.getenv("DRUG_PICTURE_ROOT", "data/pictures"))
 REPORT_PATH = Path("reports/missing_pictures.xlsx")
 
 # 支援的副檔名
 VALID_EXTS = {".jpg"}
+# 打包時可接受的來源格式（優先順序由前到後）
+SOURCE_EXTS = [".jpg", ".jpeg", ".png", ".webp", ".heic"]
+
+# 打包檔的解析度（長邊 px）與編碼品質
+PACK_SIZES = {"sm": 320, "md": 800, "lg": 1600}
+PACK_QUALITY = {"jpeg": 85, "webp": 80}
+
+
+def scan_pictures(image_root: Path):
+    """只掃一次資料夾：回傳 {批價碼: {副檔名: 路徑}}"""
+    found = {}
+    with os.scandir(image_root) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            stem, suffix = os.path.splitext(entry.name)
+            found.setdefault(stem, {})[suffix] = Path(entry.path)
+    return found
 
 
-def check_pictures(excel_path: Path, image_root: Path):
+def check_pictures(excel_path: Path, image_root: Path, pictures=None):
     df = pd.read_excel(excel_path)
+    pictures = scan_pictures(image_root) if pictures is None else pictures
 
     missing = []
     not_jpg_only = []
@@ -25,20 +58,16 @@ def check_pictures(excel_path: Path, image_root: Path):
         if not code:
             continue
 
-        matches = list(image_root.glob(f"{code}.*"))
-        matches = [p for p in matches if p.suffix in VALID_EXTS]
-
-        if not matches:
+        suffixes = set(pictures.get(code, {}))
+        if not suffixes:
             missing.append({"批價碼": code, "學名": name})
-        else:
+        elif not suffixes & VALID_EXTS:
             # 有圖片但沒有 .jpg
-            has_jpg = any(p.suffix == ".jpg" for p in matches)
-            if not has_jpg:
-                not_jpg_only.append({
-                    "批價碼": code,
-                    "學名": name,
-                    "圖片副檔名": ", ".join(sorted(set(p.suffix for p in matches)))
-                })
+            not_jpg_only.append({
+                "批價碼": code,
+                "學名": name,
+                "圖片副檔名": ", ".join(sorted(suffixes))
+            })
 
     # 輸出統計
     print("\n❌ 沒有任何圖片的藥物：")
@@ -60,5 +89,79 @@ def check_pictures(excel_path: Path, image_root: Path):
     print(f"📝 已輸出報表：{REPORT_PATH}")
 
 
+def _pick_source(by_suffix):
+    """同一個批價碼有多個檔案時依 SOURCE_EXTS 順序挑一個（副檔名不分大小寫）"""
+    lowered = {s.lower(): p for s, p in by_suffix.items()}
+    for ext in SOURCE_EXTS:
+        if ext in lowered:
+            return lowered[ext]
+    return None
+
+
+def _encode_variants(src: Path, fmt: str):
+    """回傳 {解析度名稱: 編碼後 bytes}；原圖只解碼一次，由大到小依序縮"""
+    from PIL import Image, ImageOps
+    import pillow_heif
+    pillow_heif.register_heif_opener()
+
+    out = {}
+    with Image.open(src) as img:
+        largest = max(PACK_SIZES.values())
+        img.draft("RGB", (largest, largest))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        for name, side in sorted(PACK_SIZES.items(), key=lambda kv: -kv[1]):
+            img.thumbnail((side, side), Image.LANCZOS)
+            buf = io.BytesIO()
+            if fmt == "webp":
+                img.save(buf, format="WEBP", quality=PACK_QUALITY[fmt], method=4)
+            else:
+                img.save(buf, format="JPEG", quality=PACK_QUALITY[fmt], optimize=True, progressive=True)
+            out[name] = buf.getvalue()
+    return out
+
+
+def compile_pack(image_root: Path, pack_path: Path, fmt="jpeg", pictures=None):
+    """把 image_root 的參考圖編譯成打包檔（先寫暫存檔再換上，執行中的服務不會讀到半個檔案）"""
+    pictures = scan_pictures(image_root) if pictures is None else pictures
+    pack_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = pack_path.with_suffix(pack_path.suffix + ".tmp")
+
+    t0 = time.perf_counter()
+    src_bytes = packed = failed = 0
+    with ImagePackWriter(tmp_path, fmt=fmt, sizes=PACK_SIZES) as writer:
+        for code in sorted(pictures):
+            src = _pick_source(pictures[code])
+            if src is None or not is_valid_code(code):
+                continue
+            try:
+                variants = _encode_variants(src, fmt)
+            except Exception as e:
+                print(f"  ⚠️ {src.name} 無法讀取：{e}")
+                failed += 1
+                continue
+            mtime = src.stat().st_mtime
+            for name, data in variants.items():
+                writer.add(code, name, data, mtime)
+            src_bytes += src.stat().st_size
+            packed += 1
+    os.replace(tmp_path, pack_path)
+
+    size = pack_path.stat().st_size
+    print(f"📦 打包完成：{packed} 種藥品 × {len(PACK_SIZES)} 種解析度（{fmt}），失敗 {failed} 張")
+    print(f"   原圖 {src_bytes / 1e6:.1f} MB → 打包檔 {size / 1e6:.1f} MB：{pack_path}"
+          f"（{time.perf_counter() - t0:.1f}s）")
+
+
 if __name__ == "__main__":
-    check_pictures(EXCEL_PATH, PICTURE_ROOT)
+    parser = argparse.ArgumentParser(description="參考藥品圖檢查 / 打包")
+    parser.add_argument("--excel", type=Path, default=EXCEL_PATH)
+    parser.add_argument("--pictures", type=Path, default=PICTURE_ROOT)
+    parser.add_argument("--pack", type=Path, default=DRUG_IMAGE_PACK)
+    parser.add_argument("--format", choices=["jpeg", "webp"], default="jpeg")
+    parser.add_argument("--no-pack", action="store_true", help="只輸出缺圖報表")
+    args = parser.parse_args()
+
+    pictures = scan_pictures(args.pictures)
+    check_pictures(args.excel, args.pictures, pictures=pictures)
+    if not args.no_pack:
+        compile_pack(args.pictures, args.pack, fmt=args.format, pictures=pictures)
@@ -0,0 +1,22 @@
+# export_yolo.py
+# 把 models/best.pt 匯出成 ONNX（以及 OpenVINO，若已安裝）給 CPU 推論用
+# 匯出後 app.utils.pill_detection.get_det_model 會自動改用匯出模型，請求路徑不再載入 torch
+#
+# 用法（在專案根目錄）：python export_yolo.py
+from ultralytics import YOLO
+
+IMGSZ = 640
+
+model = YOLO("models/best.pt")
+
+# 靜態 640×640 輸入（與 yolo_runtime.letterbox 一致）
+onnx_path = model.export(format="onnx", imgsz=IMGSZ, dynamic=False, simplify=True)
+print(f"✅ ONNX 匯出完成：{onnx_path}")
+
+try:
+    import openvino  # noqa: F401
+except ImportError:
+    print("ℹ️ 未安裝 openvino，跳過 OpenVINO 匯出（pip install openvino）")
+else:
+    ov_path = model.export(format="openvino", imgsz=IMGSZ)
+    print(f"✅ OpenVINO 匯出完成：{ov_path}")
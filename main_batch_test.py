@@ -140,7 +140,8 @@ def main(
         start_index: int = DEFAULT_START,
         end_index: int = DEFAULT_END,
         report_xlsx: Path = DEFAULT_REPORT_XLSX,
-        write_report: bool = True
+        write_report: bool = True,
+        stats: dict = None
 ):
     if not excel_path.exists():
         raise FileNotFoundError(f"Excel not found: {excel_path}")
@@ -162,6 +163,7 @@ def main(
     total_success = 0
     yolo_total = 0
     yolo_success = 0
+    ocr_angles_total = 0  # OCR 實際評估的角度數（process_image debug）
 
     # === NEW: 顏色誤判收集 ===
     color_errors = []  # 逐張錯誤清單
@@ -202,6 +204,7 @@ def main(
                 continue
             if res["yolo_ok"]:
                 yolo_success += 1
+            ocr_angles_total += (out.get("debug") or {}).get("ocr_angles_evaluated") or 0
             # 取出結果
             texts = out.get("文字辨識", []) or []
             shape_ = (out.get("外型", "") or "").strip()
@@ -460,9 +463,52 @@ def main(
     t2 = time.perf_counter()
     print(f"完成，總耗時 {t2 - t0:.2f}s")
 
+    if stats is not None:
+        stats.update({
+            "total_images": total_images,
+            "text_rate": text_success_total / total_images if total_images else None,
+            "shape_rate": shape_success_total / total_images if total_images else None,
+            "color_rate": color_success_total / total_images if total_images else None,
+            "elapsed_s": t2 - t0,
+            "ms_per_image": (t2 - t0) * 1000 / total_images if total_images else None,
+            "ocr_angles_per_image": ocr_angles_total / total_images if total_images else None,
+        })
+
     return shape_success_total / total_images if total_images else 0.0
 
 
+def compare_orientation_modes(excel_path, images_root, start_index, end_index):
+    """
+    刻字方向估計（估計角度 + 180°）vs 原本 8 角度掃描：文字準確率與每張耗時比較
+    （不寫報表；兩種模式各跑一次 main）
+    """
+    modes = [("8 角度掃描", False), ("方向估計 (2 角度)", True)]
+    results = []
+    original = P.OCR_ORIENTATION_ESTIMATE
+    try:
+        for label, enabled in modes:
+            P.OCR_ORIENTATION_ESTIMATE = enabled
+            print(f"\n[COMPARE] {label}")
+            run_stats = {}
+            main(excel_path, images_root, start_index, end_index, write_report=False, stats=run_stats)
+            results.append((label, run_stats))
+    finally:
+        P.OCR_ORIENTATION_ESTIMATE = original
+
+    print("\n=== 刻字方向估計比較 ===")
+    for label, st in results:
+        if not st or not st["total_images"]:
+            print(f"{label}: 無結果")
+            continue
+        print(f"{label}: 文字成功率={st['text_rate']:.2%}  每張 {st['ms_per_image']:.1f} ms  "
+              f"平均 OCR 角度數={st['ocr_angles_per_image']:.2f}  （{st['total_images']} 張）")
+    if all(st and st["total_images"] for _, st in results):
+        (_, base), (_, est) = results
+        print(f"文字成功率差異：{(est['text_rate'] - base['text_rate']) * 100:+.2f} pt；"
+              f"加速：{base['ms_per_image'] / est['ms_per_image']:.2f}x")
+    return results
+
+
 def _set_shape_thresholds(circle_lo, circle_hi, ellipse_hi):
     # 匯入你剛剛加了全域參數的模組
     import app.utils.shape_color_utils as scu
@@ -479,8 +525,11 @@ if __name__ == "__main__":
 
     DO_SEARCH = False  # 想直接跑單次就設 False
     # DO_SEARCH = False  # 想直接跑單次就設 False
+    DO_COMPARE_ORIENTATION = os.environ.get("BATCH_COMPARE_ORIENTATION", "0") == "1"
     _set_shape_thresholds(1.00, 1.20, 3.80)
-    if not DO_SEARCH:
+    if DO_COMPARE_ORIENTATION:
+        compare_orientation_modes(excel, root, start, end)
+    elif not DO_SEARCH:
         # 單次跑：用目前預設門檻
         acc = main(excel, root, start, end, report, write_report=True)  # 或 main(..., write_report=True)
         print(f"[RUN] shape accuracy = {acc:.4%}")
@@ -0,0 +1,195 @@
+# quantize_models.py
+# OpenOCR 偵測/辨識模型 INT8 量化（build）與準確率/延遲評估（eval）
+#
+# 用法（在專案根目錄，先執行 setup_models.py 下載 FP32 模型）：
+#   python quantize_models.py build                 # 靜態量化（以 data/pictures 校正）
+#   python quantize_models.py build --mode dynamic  # 動態量化（只量化權重，不需校正集）
+#   python quantize_models.py eval                  # FP32 vs INT8：OCR 延遲 + main_batch_test 文字準確率
+# 線上啟用：OCR_INT8=1（模型不存在時自動退回 FP32）
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+import app.utils.ocr_engine as E
+from app.utils.image_io import read_image_safely
+from app.utils.ocr_utils import recognize_with_openocr_array
+
+PICTURE_ROOT = Path("data/pictures")
+DET_FP32 = Path(E.OCR_DET_MODEL_PATH)
+REC_FP32 = Path(E.OCR_REC_MODEL_PATH)
+DET_INT8 = Path(E.OCR_DET_INT8_MODEL_PATH)
+REC_INT8 = Path(E.OCR_REC_INT8_MODEL_PATH)
+
+
+def _picture_paths(offset, count):
+    """依檔名排序後等距取樣，校正集與評估集用不同 offset 避免重疊"""
+    paths = sorted(p for p in PICTURE_ROOT.glob("*") if p.suffix.lower() in {".jpg", ".jpeg", ".png"})
+    if not paths:
+        raise FileNotFoundError(f"找不到校正圖片：{PICTURE_ROOT}")
+    step = max(1, len(paths) // count)
+    return paths[offset::step][:count]
+
+
+def _load_images(paths):
+    imgs = [read_image_safely(p) for p in paths]
+    return [img for img in imgs if img is not None]
+
+
+def _collect_calibration_inputs(images):
+    """
+    用 FP32 引擎的前處理產生校正輸入：
+    - 偵測模型：整張圖經 DetResizeForTest / Normalize 後的 tensor
+    - 辨識模型：FP32 偵測到的文字框裁切圖經辨識前處理後的 tensor
+    """
+    from tools.infer_e2e import sorted_boxes
+    from tools.infer.utility import get_rotate_crop_image
+
+    engine = E.create_ocr_engine()
+    det, rec = engine.text_detector, engine.text_recognizer
+    det_inputs, rec_inputs = [], []
+    for img in images:
+        batch = det.transform({"image": img}, det.ops[1:])
+        det_inputs.append(np.expand_dims(batch[0], axis=0).astype(np.float32))
+
+        boxes = det(img_numpy=img)[0]["boxes"]
+        if boxes is None or len(boxes) == 0:
+            continue
+        for box in sorted_boxes(np.asarray(boxes)):
+            crop = get_rotate_crop_image(img, np.array(box, dtype=np.float32))
+            rb = rec.transform({"image": crop}, rec.ops[1:])
+            x = rb[0] if isinstance(rb[0], np.ndarray) else rb[0].numpy()
+            rec_inputs.append(np.expand_dims(x, axis=0).astype(np.float32))
+    return det_inputs, rec_inputs
+
+
+def _calibration_reader(model_path, inputs):
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationDataReader
+
+    input_name = ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            self._it = iter({input_name: x} for x in inputs)
+
+        def get_next(self):
+            return next(self._it, None)
+
+    return _Reader()
+
+
+def build(mode="static", n_calib=32):
+    try:
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    except ImportError as e:
+        print(f"❗ 需要 onnx 套件才能量化（pip install onnx）：{e}")
+        return
+
+    for p in (DET_FP32, REC_FP32):
+        if not p.exists():
+            print(f"❗ 找不到 FP32 模型：{p}（請先執行 python setup_models.py）")
+            return
+
+    t0 = time.perf_counter()
+    if mode == "dynamic":
+        for src, dst in ((DET_FP32, DET_INT8), (REC_FP32, REC_INT8)):
+            quantize_dynamic(str(src), str(dst), weight_type=QuantType.QInt8)
+            print(f"✅ 動態量化：{src} → {dst}")
+    else:
+        images = _load_images(_picture_paths(offset=0, count=n_calib))
+        det_inputs, rec_inputs = _collect_calibration_inputs(images)
+        print(f"📐 校正集：{len(images)} 張圖 → 偵測 {len(det_inputs)} 筆、文字框 {len(rec_inputs)} 筆")
+        for src, dst, inputs in ((DET_FP32, DET_INT8, det_inputs), (REC_FP32, REC_INT8, rec_inputs)):
+            if not inputs:
+                print(f"⚠️ {src} 沒有校正資料，改用動態量化")
+                quantize_dynamic(str(src), str(dst), weight_type=QuantType.QInt8)
+                continue
+            quantize_static(
+                str(src), str(dst), _calibration_reader(src, inputs),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True,
+            )
+            print(f"✅ 靜態量化：{src} → {dst}")
+
+    for src, dst in ((DET_FP32, DET_INT8), (REC_FP32, REC_INT8)):
+        print(f"   {dst.name}: {src.stat().st_size / 1e6:.1f} MB → {dst.stat().st_size / 1e6:.1f} MB")
+    print(f"完成，總耗時 {time.perf_counter() - t0:.1f}s")
+
+
+def _time_ocr(images, repeat=3):
+    """回傳 (每張平均 ms, 每張辨識文字)；第一輪不計時（預熱）"""
+    engine = E.get_ocr_engine()
+    texts = [recognize_with_openocr_array(img, ocr_engine=engine)[0] for img in images]
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for img in images:
+            recognize_with_openocr_array(img, ocr_engine=engine)
+    return (time.perf_counter() - t0) * 1000 / (repeat * len(images)), texts
+
+
+def _run_variant(int8, images, batch_args):
+    E.OCR_INT8 = int8
+    E.reset_ocr_engines()
+    ms, texts = _time_ocr(images)
+    batch_stats = {}
+    if batch_args is not None:
+        import main_batch_test
+        main_batch_test.main(*batch_args, write_report=False, stats=batch_stats)
+    return {"ms": ms, "texts": texts, "batch": batch_stats}
+
+
+def evaluate(n_eval=32, with_batch=True):
+    if not (DET_INT8.exists() and REC_INT8.exists()):
+        print("❗ 找不到 INT8 模型，請先執行 python quantize_models.py build")
+        return
+
+    # 評估集與校正集錯開（offset=1）
+    images = _load_images(_picture_paths(offset=1, count=n_eval))
+    batch_args = None
+    if with_batch:
+        import main_batch_test
+        if main_batch_test.DEFAULT_IMAGES_ROOT.exists():
+            batch_args = (main_batch_test.DEFAULT_EXCEL, main_batch_test.DEFAULT_IMAGES_ROOT,
+                          main_batch_test.DEFAULT_START, main_batch_test.DEFAULT_END)
+        else:
+            print(f"⚠️ 找不到批次測試圖片：{main_batch_test.DEFAULT_IMAGES_ROOT}，只比較 OCR 延遲與輸出一致率")
+
+    original = E.OCR_INT8
+    try:
+        fp32 = _run_variant(False, images, batch_args)
+        int8 = _run_variant(True, images, batch_args)
+    finally:
+        E.OCR_INT8 = original
+        E.reset_ocr_engines()
+
+    agree = np.mean([a == b for a, b in zip(fp32["texts"], int8["texts"])]) if images else 0.0
+    print(f"\n📊 INT8 評估（{len(images)} 張參考圖）：")
+    print(f" - OCR 延遲：FP32 {fp32['ms']:.1f} ms → INT8 {int8['ms']:.1f} ms（加速 {fp32['ms'] / int8['ms']:.2f}x）")
+    print(f" - OCR 輸出與 FP32 完全一致：{agree:.2%}")
+    if fp32["batch"] and int8["batch"]:
+        delta = (int8["batch"]["text_rate"] - fp32["batch"]["text_rate"]) * 100
+        print(f" - main_batch_test 文字成功率：FP32 {fp32['batch']['text_rate']:.2%} → "
+              f"INT8 {int8['batch']['text_rate']:.2%}（{delta:+.2f} pt）")
+        print(f" - main_batch_test 每張耗時：{fp32['batch']['ms_per_image']:.1f} ms → "
+              f"{int8['batch']['ms_per_image']:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenOCR INT8 量化 / 評估")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="產生 INT8 模型到 models/")
+    p_build.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    p_build.add_argument("--n-calib", type=int, default=32)
+    p_eval = sub.add_parser("eval", help="FP32 vs INT8 準確率與延遲")
+    p_eval.add_argument("--n-eval", type=int, default=32)
+    p_eval.add_argument("--no-batch", action="store_true", help="不跑 main_batch_test")
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        build(mode=args.mode, n_calib=args.n_calib)
+    else:
+        evaluate(n_eval=args.n_eval, with_batch=not args.no_batch)